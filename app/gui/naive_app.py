@@ -6,7 +6,7 @@ from dash import dcc, html, Input, Output, ctx, MATCH, ALL
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 from gui.dash_template import new_app
-from model.naive_model import MicroChannelCooler, Geometry
+from model.naive_model import naive_model_cached
 from model.fluids import fluids, fluidoptions
 from model.limits import test_input, test_single_input, microscale, kelvin, limits
 from config import update_style
@@ -74,14 +74,7 @@ def make_naive_app(server, prefix):
         except:
             raise PreventUpdate
 
-        q = np.empty( len(H) )
-        dP = np.empty( len(H) )
-        T_out = np.empty( len(H) )
-        
-        for i in range(len(H)):
-            geom = Geometry(L, W, H[i])
-            cooler = MicroChannelCooler(T_in, T_w, Q, geom, F)
-            q[i], dP[i], T_out[i] = cooler.solve()
+        q, dP, T_out = naive_model_cached(T_in, T_w, Q, L, W, H, **F.__dict__)
 
         fig = make_subplots(rows=1, cols=3, column_widths=[.33, .33, .33])
 
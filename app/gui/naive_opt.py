@@ -1,23 +1,16 @@
-import uuid
 from dash import dcc, html, Input, Output, State, callback_context as ctx
 import dash_bootstrap_components as dbc
-import diskcache
+from dash.exceptions import PreventUpdate
 from gui.dash_template import new_app
 from model.naive_model import Geometry
 from model.fluids import fluids, fluidoptions
-from dash.long_callback import DiskcacheLongCallbackManager
 from model.sgd_model import SGD_MicroChannelCooler, cancel_opt
+from model.jobs import job_manager
 from model.limits import microscale, kelvin, limits
-import time
 
 def make_naive_app_opt(server, prefix):
     
-    session_id = str(uuid.uuid4())
-
-    cache = diskcache.Cache("./cache")
-    long_manager = DiskcacheLongCallbackManager(cache)
-
-    app = new_app(server, prefix, long_manager, centered='center')
+    app = new_app(server, prefix, centered='center')
     app.title = "Single Channel Enthalpy Transfer"
     app.version = 0.1
     # don't use H2 - that is reserved for dropdowns in Flask right now
@@ -52,82 +45,98 @@ def make_naive_app_opt(server, prefix):
                     ]),
                     html.Br(),
                     html.Button(id="button_id", children="Run", n_clicks=0),
-                    html.Button(id="cancel_button_id", children="Cancel Running Job"),
+                    html.Button(id="cancel_button_id", children="Cancel Running Job", disabled=True),
+                    dcc.Store(id='job_id'),
+                    dcc.Interval(id='poll', interval=500, disabled=True), # enabled while a job runs
                 ])
 
             ], className='input'),		
         ])
     
-    def _session(session_id, fluid):
-        @cache.memoize()
-        def make_(session_id):
-            
-            # TODO make this automatic using structure in limits dict.
-            # TODO add user override for initial values
-            L = limits['L']['init'] # length of microchannel [m]
-            W = limits['W']['init'] * microscale # width of microchannel [m]
-            H = limits['H']['init'] * microscale # depth of microchannel [m]
+    def run_opt(par, fluid, progress, checkpoint=None):
+        # TODO make this automatic using structure in limits dict.
+        # TODO add user override for initial values
+        L = limits['L']['init'] # length of microchannel [m]
+        W = limits['W']['init'] * microscale # width of microchannel [m]
+        H = limits['H']['init'] * microscale # depth of microchannel [m]
 
-            T_in = limits['T_in']['init'] + kelvin # inlet temperature [K]
-            T_w = limits['T_w']['init'] + kelvin # inlet temperature [K]
+        T_in = limits['T_in']['init'] + kelvin # inlet temperature [K]
+        T_w = limits['T_w']['init'] + kelvin # inlet temperature [K]
 
-            Q = limits['Q']['init'] # flow rate [uL/min]
-            
-            try: 
-                F = fluids[fluid]
-            except Exception as e:
-                F = fluids[0]
-
-            geom = Geometry(L, W, H)
-            cooler = SGD_MicroChannelCooler(T_in, T_w, Q, geom, F)
-            return cooler
-        
-        return make_(session_id)
-  
-    @app.long_callback(
-        output=Output("paragraph_id", "children"),
-        inputs=[
-            Input('button_id', 'n_clicks'),
-            Input('cancel_button_id', 'n_clicks'),
-            State('par','value'),
-            State('fluid','value'),
-        ],
-        running=[
-            (Output("button_id", "disabled"), True, False),
-            (Output("cancel_button_id", "disabled"), False, True),
-            (
-                Output("paragraph_id", "style"),
-                {"visibility": "hidden"},
-                {"visibility": "visible"},
-            ),
-            (
-                Output("progress_bar", "style"),
-                {"visibility": "visible"},
-                {"visibility": "hidden"},
-            ),
-        ],
-        cancel=[Input("cancel_button_id", "n_clicks")],
-        progress=[Output("progress_bar", "value"), Output("progress_bar", "max")],
-        prevent_initial_call=True,
-    )
+        Q = limits['Q']['init'] # flow rate [uL/min]
 
+        try:
+            F = fluids[int(fluid)]
+        except Exception as e:
+            F = fluids[0]
 
+        geom = Geometry(L, W, H)
+        cooler = SGD_MicroChannelCooler(T_in, T_w, Q, geom, F)
+        return cooler.solve_sgd(parameter_choice = par, optimize_type='default', progress=progress, checkpoint=checkpoint)
 
-    def callback(set_progress, n_clicks, cancel, par, fluid): # don't remove the 'cancel' argument
-        set_progress((0, 100))
+    @app.callback(
+        Output('job_id', 'data'),
+        Input('button_id', 'n_clicks'),
+        Input('cancel_button_id', 'n_clicks'),
+        State('par','value'),
+        State('fluid','value'),
+        State('job_id', 'data'),
+        prevent_initial_call=True,
+    )
+    def callback(n_clicks, cancel, par, fluid, job_id):
+        # each browser session keeps its own job id, so users never share a job
         trigger = ctx.triggered[0]
         print(trigger)
         if trigger["prop_id"]=="cancel_button_id.n_clicks":
-            print("canceling")
-            cooler = _session(session_id, fluid) # get the session
-            cancel_opt(cooler)
-            return ["Optimization Canceled"]
+            if job_id is not None:
+                print("canceling")
+                cancel_opt(job_id)
+            return job_id
         elif n_clicks > 0:
-            cooler = _session(session_id, fluid) # make a new session
-            L_optimized, W_optimized, H_optimized = cooler.solve_sgd(parameter_choice = par, optimize_type='default', progress=set_progress)
-            return [f"Length:\t{L_optimized},\nWidth:\t{W_optimized},\nDepth:\t{H_optimized}"]
+            return job_manager.submit(run_opt, par, fluid)
         else:
-            return["Optimize Channel Parameters:"]
+            raise PreventUpdate
 
-    return app.server
+    @app.callback(
+        Output("paragraph_id", "children"),
+        Output("progress_bar", "value"),
+        Output("progress_bar", "max"),
+        Output("progress_bar", "style"),
+        Output("button_id", "disabled"),
+        Output("cancel_button_id", "disabled"),
+        Output('poll', 'disabled'),
+        Input('poll', 'n_intervals'),
+        Input('job_id', 'data'),
+    )
+    def poll(n_intervals, job_id):
+        if job_id is None:
+            return ["Optimize Channel Parameters:"], 0, 100, {"visibility": "hidden"}, False, True, True
+
+        # one lookup, the job manager may forget (prune) finished jobs at any time
+        job = job_manager.get(job_id)
+        if job is None:
+            return ["Optimization result is no longer available, please run it again."], 0, 100, {"visibility": "hidden"}, False, True, True
+        info = job.info()
 
+        running = info['status'] in ('queued', 'running')
+        style = {"visibility": "visible" if running else "hidden"}
+        total = max(info['total'], 1)
+
+        if info['status'] == 'queued':
+            text = ["Waiting for a free worker ..."]
+        elif info['status'] == 'running':
+            text = [f"Optimizing ... iteration {info['iteration']}/{info['total']}"]
+        elif info['status'] == 'cancelled':
+            text = ["Optimization Canceled"]
+        elif info['status'] == 'failed':
+            text = [f"Optimization Failed: {info['error']}"]
+        elif job.result is None:
+            text = ["Optimization finished without a result."]
+        else:
+            L_optimized, W_optimized, H_optimized = job.result
+            text = [f"Length:\t{L_optimized},\nWidth:\t{W_optimized},\nDepth:\t{H_optimized}"]
+
+        # stop polling once the job reached a terminal state
+        return text, info['iteration'], total, style, running, not running, not running
+
+    return app.server
@@ -5,7 +5,7 @@ from flask_expects_json import expects_json
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 from model import schemes
-from model.naive_model import Geometry, MicroChannelCooler
+from model.naive_model import naive_model_cached
 from model.fluids import water
 from model.tools import preprocess_input, convert_numpy_to_list
 
@@ -20,10 +20,9 @@ def naive():
     raw_data = request.get_json()
     data = preprocess_input(raw_data)
     
-    geom = Geometry( data['L'], data['W'], data['D'] )
-    cooler = MicroChannelCooler(geom, water, data['T_in'], data['T_w'], data['Q'])
-
-    q, dP, T_out = cooler.solve()
+    q, dP, T_out = naive_model_cached(data['T_in'], data['T_w'], data['Q'],
+                                      data['L'], data['W'], data['D'],
+                                      **water.__dict__)
 
     out = {
         'input': raw_data,
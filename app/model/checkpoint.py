@@ -0,0 +1,29 @@
+#!/bin/python3
+
+import os
+import diskcache
+
+# the same directory the Dash apps use for their diskcache
+checkpoint_dir = os.environ.get('OPT_CHECKPOINT_DIR', './cache')
+# seconds a checkpoint is kept after its last save, so checkpoints of runs that
+# were abandoned (never resumed nor finished) do not pile up
+checkpoint_expire = float(os.environ.get('OPT_CHECKPOINT_EXPIRE', 7 * 24 * 3600))
+_cache = None
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = diskcache.Cache(checkpoint_dir)
+    return _cache
+
+def save_checkpoint(key, state):
+    # Store the optimizer state dict under key (e.g. a job id), replacing the previous one
+    _get_cache().set(('checkpoint', key), state, expire=checkpoint_expire)
+
+def load_checkpoint(key):
+    # Returns the last state stored under key, or None
+    return _get_cache().get(('checkpoint', key))
+
+def clear_checkpoint(key):
+    # Forget the state stored under key, e.g. once its run finished
+    _get_cache().delete(('checkpoint', key))
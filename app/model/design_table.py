@@ -0,0 +1,96 @@
+#!/bin/python3
+
+import numpy as np
+from model.fluids import water
+from model.naive_model import naive_model_batch
+from model.tools import to_model_input
+
+class DesignTable:
+
+    columns = ['T_in', 'T_w', 'Q', 'L', 'W', 'H']
+
+    def __init__(self, fluid=water, dtype=np.float64, **columns):
+        # Initialize DesignTable, a struct-of-arrays store of N designs
+        # that is solved without building a Geometry / MicroChannelCooler per row
+        #
+        # fluid : a Fluid, shared by all designs
+        # dtype : column data type (np.float32 halves the memory of large sweeps)
+        # T_in : fluid inlet temperature [K]
+        # T_w : wall temperature [K]
+        # Q : fluid flow rate [uL/min]
+        # L : channel length [m]
+        # W : channel width [m]
+        # H : channel height/depth [m]
+        #
+        # each column is a scalar or an array, broadcast to a common length N
+
+        missing = [name for name in self.columns if name not in columns]
+        if missing:
+            raise ValueError(f"Missing DesignTable columns: {missing}")
+
+        values = np.broadcast_arrays(*(np.atleast_1d(columns[name]) for name in self.columns))
+        if values[0].ndim != 1:
+            raise ValueError("DesignTable columns must be scalars or 1-dimensional arrays")
+
+        self.fluid = fluid
+        self.dtype = np.dtype(dtype)
+        self.data = {name: np.ascontiguousarray(value, dtype=self.dtype)
+                     for name, value in zip(self.columns, values)}
+
+    @classmethod
+    def from_specs(cls, specs, fluid=water, dtype=np.float64):
+        # Build the full factorial sweep of the given specs
+        #
+        # specs : dict of column name -> number, or a range spec as accepted
+        #         by model.tools.to_model_input ({'type': 'linspace', ...})
+        #
+        # rows are ordered with the last range-valued column varying fastest
+
+        axes = [np.atleast_1d(to_model_input(specs[name])) for name in cls.columns]
+        shape = tuple(len(axis) for axis in axes)
+        n = int(np.prod(shape))
+
+        # fill each column in place, so the sweep is never materialized as
+        # an intermediate meshgrid
+        table = cls.__new__(cls)
+        table.fluid = fluid
+        table.dtype = np.dtype(dtype)
+        table.data = {}
+        for i, (name, axis) in enumerate(zip(cls.columns, axes)):
+            column = np.empty(n, dtype=table.dtype)
+            view = [1] * len(shape)
+            view[i] = -1
+            column.reshape(shape)[...] = axis.reshape(view)
+            table.data[name] = column
+
+        return table
+
+    def __len__(self):
+        return len(self.data['L'])
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def solve(self, N_ELE=1000, chunk=2**20):
+        # Returns the heat flux, pressure drop, and output temperature of
+        # every design using the closed-form naive method
+        #
+        # chunk : number of rows solved per vectorized call, which bounds the
+        #         size of the temporary arrays
+        #
+        # Returns
+        # q : the heat flux [W/cm^2], length N
+        # dP : the pressure loss [Pa], length N
+        # T_out : the outlet temperature [K], length N
+
+        n = len(self)
+        q = np.empty(n, dtype=self.dtype)
+        dP = np.empty(n, dtype=self.dtype)
+        T_out = np.empty(n, dtype=self.dtype)
+
+        for start in range(0, n, chunk):
+            s = slice(start, start + chunk)
+            q[s], dP[s], T_out[s] = naive_model_batch(*(self.data[name][s] for name in self.columns),
+                                                      **self.fluid.__dict__, N_ELE=N_ELE)
+
+        return q, dP, T_out
@@ -0,0 +1,132 @@
+#!/bin/python3
+
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from model.checkpoint import clear_checkpoint
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+
+    def __init__(self, job_id):
+        # Initialize Job
+        #
+        # job_id : unique id of the job
+
+        self.id = job_id
+        self.status = 'queued' # queued, running, done, cancelled or failed
+        self.iteration = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    def progress(self, value):
+        # Progress callback for the optimizers, called with [iteration, total]
+        # between iterations. This is also where cancellation takes effect.
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.iteration, self.total = int(value[0]) + 1, int(value[1])
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def info(self):
+        # Returns a snapshot of the job state
+        return {
+            'id': self.id,
+            'status': self.status,
+            'iteration': self.iteration,
+            'total': self.total,
+            'error': self.error,
+        }
+
+
+class JobManager:
+
+    def __init__(self, max_workers=2, max_jobs=256):
+        # Initialize JobManager, a bounded pool of optimization jobs
+        #
+        # max_workers : number of jobs that run at the same time, the rest are queued
+        # max_jobs : number of finished jobs to remember
+
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='opt-job')
+
+    def submit(self, fn, *args, **kwargs):
+        # Queue fn(*args, progress=job.progress, checkpoint=job.id, **kwargs) and
+        # return its job id
+        #
+        # fn must report progress through the progress callback between
+        # iterations, which is where a cancelled job stops, and save its
+        # checkpoints under the job id (see model.checkpoint)
+
+        job = Job(str(uuid.uuid4()))
+
+        def run():
+            if job.cancelled():
+                job.status = 'cancelled'
+                return
+            job.status = 'running'
+            try:
+                job.result = fn(*args, progress=job.progress, checkpoint=job.id, **kwargs)
+                job.status = 'done'
+            except JobCancelled:
+                job.status = 'cancelled'
+                clear_checkpoint(job.id)
+            except Exception as e:
+                job.error = f'{type(e).__name__}: {e}'
+                job.status = 'failed'
+
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+            job.future = self._pool.submit(run)
+        return job.id
+
+    def cancel(self, job_id):
+        # Request cancellation of a job, returns False if the job is unknown
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job._cancel.set()
+        if job.future.cancel(): # still queued, it never starts
+            job.status = 'cancelled'
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def status(self, job_id):
+        # Returns the job info dict, or None if the job is unknown
+        job = self.get(job_id)
+        return None if job is None else job.info()
+
+    def result(self, job_id, timeout=None):
+        # Wait for a job and return its result (None unless it finished)
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.future.cancelled():
+            job.future.result(timeout)
+        return job.result
+
+    def _prune(self):
+        # forget the oldest finished jobs beyond max_jobs
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job.status in ('done', 'cancelled', 'failed')]
+        for job_id in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+
+job_manager = JobManager(max_workers=int(os.environ.get('OPT_JOB_WORKERS', 2)))
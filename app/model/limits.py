@@ -1,5 +1,4 @@
 from dash.exceptions import PreventUpdate
-import torch
 kelvin = 273.15
 microscale = 1e-6
 limits = {      
@@ -152,13 +151,20 @@ def test_input(var_dict):
 
 
 def clamp_variables(opt,old_opt,parameter_choice):
-    for var in opt:
-        if var in limits:
-            if var in parameter_choice:
-                # print(var)
-                minl = limits[var]['min'] * limits[var]['scale'] + limits[var]['shift']
-                maxl = limits[var]['max'] * limits[var]['scale'] + limits[var]['shift']
-                opt[var] = torch.clamp(opt[var], min=minl, max=maxl)
-                opt[var] = opt[var].detach()
-            else:
-                opt[var] = old_opt[var]
+    # clamps in place, so the tensors keep their gradients and stay attached to the optimizer
+    import torch
+    with torch.no_grad():
+        for var in opt:
+            if var in limits:
+                if var in parameter_choice:
+                    # print(var)
+                    minl, maxl = get_bounds(var)
+                    opt[var].clamp_(min=minl, max=maxl)
+                else:
+                    opt[var].copy_(old_opt[var])
+
+def get_bounds(var):
+    # model-unit (SI) bounds of a variable in limits
+    minl = limits[var]['min'] * limits[var]['scale'] + limits[var]['shift']
+    maxl = limits[var]['max'] * limits[var]['scale'] + limits[var]['shift']
+    return minl, maxl
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class Anderson:
+
+    def __init__(self, depth=5, mixing=1.0):
+        # Initialize Anderson, Anderson acceleration of a fixed-point iteration x = G(x)
+        # (Walker & Ni, 2011). Each update extrapolates from the last depth iterates, with
+        # the combination of their residuals G(x) - x that has the smallest norm.
+        #
+        # depth : number of previous iterates used (m), 1 is a vector Aitken / secant step
+        # mixing : fraction of G(x) taken in each update (beta), 1 for undamped
+
+        self.depth = depth
+        self.mixing = mixing
+        self.reset()
+
+    def reset(self):
+        # forget the history, the next update is a plain G(x)
+        self.x = None
+        self.f = None
+        self.dX = [] # differences of the iterates
+        self.dF = [] # differences of the residuals
+
+    def __call__(self, x, g):
+        # Returns the next iterate from the current iterate x and g = G(x), arrays of any shape
+        shape = x.shape
+        x, g = x.ravel(), g.ravel()
+        f = g - x
+        if self.f is not None:
+            if np.linalg.norm(f) < 2.0 * np.linalg.norm(self.f):
+                self.dX.append(x - self.x)
+                self.dF.append(f - self.f)
+                del self.dX[:-self.depth], self.dF[:-self.depth]
+            else: # the extrapolation made things worse, start over
+                self.dX, self.dF = [], []
+        self.x, self.f = x, f
+
+        if not self.dF:
+            return (x + self.mixing * f).reshape(shape)
+
+        dX = np.stack(self.dX, axis=1)
+        dF = np.stack(self.dF, axis=1)
+        gamma = np.linalg.lstsq(dF, f, rcond=None)[0]
+        return (x + self.mixing * f - (dX + self.mixing * dF) @ gamma).reshape(shape)
@@ -8,16 +8,37 @@ def calculate_Re(fluid: ti.template(), geometry: ti.template()):
             for k in range(geometry.nz):
                 geometry.Re[i,j,k] = fluid.rho * ti.abs(geometry.velocity[i,j,k,0]) * geometry.D_channel / fluid.mu
  
+@ti.func
+def nusselt(fluid: ti.template(), geometry: ti.template(), i: ti.i32, j: ti.i32, k: ti.i32):
+    Nu_uncor = 2 + 0.552 * geometry.Re[i,j,k]**0.5 * fluid.Pr**(1/3) # Nusselt number, uncorrected (Zhuifu, 2013)
+    BTp = fluid.cp * (geometry.temp[i,j,k] - fluid.T_boiling_point) / fluid.latent_heat_of_vaporization # Spalding number (technically temp should be far-field, but this is for a vaporized droplet, so far-field is the same as local)
+    fT = (1 + BTp)**(-2/3) # Zhuifu model (2013)
+    return Nu_uncor*fT # Nusselt number, correction for Zhuifu model (2013
+
 @ti.kernel # TODO (@akhilsadam) improve to only calculate on edges!
 def calculate_Nu(fluid: ti.template(), geometry: ti.template()):
     ti.loop_config(parallelize=8, block_dim=16)
     for i in range(geometry.nx):
         for j in range(geometry.ny):
             for k in range(geometry.nz):
-                Nu_uncor = 2 + 0.552 * geometry.Re[i,j,k]**0.5 * fluid.Pr**(1/3) # Nusselt number, uncorrected (Zhuifu, 2013)
-                BTp = fluid.cp * (geometry.temp[i,j,k] - fluid.T_boiling_point) / fluid.latent_heat_of_vaporization # Spalding number (technically temp should be far-field, but this is for a vaporized droplet, so far-field is the same as local)
-                fT = (1 + BTp)**(-2/3) # Zhuifu model (2013)
-                geometry.Nu[i,j,k] = Nu_uncor*fT # Nusselt number, correction for Zhuifu model (2013
+                geometry.Nu[i,j,k] = nusselt(fluid, geometry, i, j, k)
+                geometry.temp_Nu[i,j,k] = geometry.temp[i,j,k]
+
+@ti.kernel
+def update_Nu(fluid: ti.template(), geometry: ti.template(), tol: ti.f32):
+    # Recompute Nu only at the fluid nodes (the only ones the resistances read) whose
+    # temperature moved more than tol [K] since their last update, flag them in Nu_changed
+    # and count them in n_Nu_changed
+    ti.loop_config(parallelize=8, block_dim=16)
+    for n in range(geometry.n_fluid):
+        i, j, k = geometry.fluid_nodes[n][0], geometry.fluid_nodes[n][1], geometry.fluid_nodes[n][2]
+        changed = 0
+        if ti.abs(geometry.temp[i,j,k] - geometry.temp_Nu[i,j,k]) > tol:
+            geometry.Nu[i,j,k] = nusselt(fluid, geometry, i, j, k)
+            geometry.temp_Nu[i,j,k] = geometry.temp[i,j,k]
+            changed = 1
+            geometry.n_Nu_changed[0] += 1
+        geometry.Nu_changed[i,j,k] = changed
 
 @ti.kernel
 def setup_fluid_velocity(Q: ti.f32, geometry: ti.template()):
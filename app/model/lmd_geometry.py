@@ -1,4 +1,5 @@
 import taichi as ti    
+import numpy as np
 
 @ti.data_oriented
 class Geometry:
@@ -9,6 +10,7 @@ class Geometry:
             'n_channel': 30,
             'nx': 50, 'ny_channel': 6, 'ny_wall': 2, 'nz_channel': 6, 'nz_wall': 2,
             'h': 1e-7, 'substep': 1,
+            'symmetry': None,
         } 
         # param = {
         #     'L_chip': 0.02, 'W_chip': 0.00012, 'H_chip': 0.0001,
@@ -36,6 +38,20 @@ class Geometry:
         self.nx = param['nx']
         self.ny = (param['ny_channel'] + param['ny_wall'] * 2) * (param['n_channel'])
         self.nz = (param['nz_channel'] + param['nz_wall'] * 2)
+
+        # symmetry : None to model all n_channel unit cells, or 'periodic' to model one unit
+        #            cell, when the channels see the same heat flux (see
+        #            lmd_heat_flux.detect_symmetry). The grid is then periodic in y: the +y
+        #            faces of its last column connect to the first one. expand tiles the
+        #            results over the die.
+        self.symmetry = param['symmetry']
+        self.ny_full = self.ny
+        if self.symmetry == 'periodic':
+            self.ny = param['ny_channel'] + param['ny_wall'] * 2
+        elif self.symmetry is not None:
+            raise ValueError("Invalid symmetry, must be None or 'periodic'")
+        self.periodic_y = self.symmetry is not None
+        self.ny_faces = self.ny if self.periodic_y else self.ny - 1 # columns of the nodes with faces, see lmd_model.face_current
         self.nn = self.nx * self.ny * self.nz
 
         # physical parameters
@@ -79,6 +95,7 @@ class Geometry:
         # example here https://github.com/hejob/taichi-fvm2d-fluid-ns/blob/master/multiblocksolver/block_solver.py
         self.temp = ti.field(ti.f32, shape = nodes,) 
         self.temp_next = ti.field(ti.f32, shape = nodes,)
+        self.temp_save = ti.field(ti.f32, shape = nodes,) # snapshot to roll back a diverging step
         self.heat_flux = ti.field(ti.f32, shape = nodes,)
         self.net_flux = ti.field(ti.f32, shape = nodes,)
         self.isfluid = ti.field(ti.i32, shape = nodes,)
@@ -88,7 +105,8 @@ class Geometry:
         self.interface_area = ti.field(ti.f32, shape = (*elements2,self.nd), offset=(-1,-1,-1, 0)) # TODO area of interface between solid and fluid, @colenockolds
 
         self.heat_capacity = ti.field(ti.f32, shape = nodes,) # TODO @longvu
-        self.sum_temp = ti.field(ti.f32, shape = (1,))
+        self.sum_temp = ti.field(ti.f64, shape = (1,)) # residual, sum of |dT| of the last step
+        self.max_temp = ti.field(ti.f32, shape = (1,)) # residual, max of |dT| of the last step
         
         # Resistance / intermediate arrays:
         self.current = ti.field(ti.f32, shape = (*elements2,self.nd), offset=(-1,-1,-1,0)) # 4D array (elements x nd), for x-y-z springs) (this is basically dynamic heat flux)
@@ -230,12 +248,12 @@ class Geometry:
                             i = i0 - 1
                         elif i0 == -1:
                             i = 0
-                        if j0 == self.ny - 1 or j0 == -1:
+                        if j0 == self.ny_faces or j0 == -1:
                             j = 0
                         if k0 == self.nz - 1 or k0 == -1:
                             k = 0
                         
-                        point_stepy = self.isfluid[i,j+1,k]
+                        point_stepy = self.isfluid[i,(j+1) % self.ny,k]
                         point_stepz = self.isfluid[i,j,k+1]
                         
                         Ix, Iy, Iz = determine_interface_types(point, point_stepy, point_stepz)
@@ -251,7 +269,7 @@ class Geometry:
                         
                         # print(Ix, self.interface_area[i0,j0,k0,0]*1.0e11, self.interface_area[i0,j0,k0,1]*1.0e11, self.interface_area[i0,j0,k0,2]*1.0e11)
         make_materials()
-        
+
         # @ti.kernel
         # def shift(geo:ti.template()):
         #     for z in range(-1,geo.nz):
@@ -302,9 +320,28 @@ class Geometry:
 
         self.ijk_to_xyz = ijk_to_xyz
 
+        # node coordinates and centre distances of the faces, computed once here and looked
+        # up by the kernels (the ijk_to_xyz branches and sqrt are not repeated per resistance)
+        self.xyz = ti.Vector.field(3, ti.f32, shape = nodes,) # ijk_to_xyz of each node
+        self.distance = ti.field(ti.f32, shape = (*elements2,self.nd), offset=(-1,-1,-1,0)) # from node (i,j,k) to its w neighbour
+
+        @ti.kernel
+        def make_coordinates():
+            for i, j, k in self.xyz:
+                p = ti.Vector(ijk_to_xyz(i,j,k))
+                self.xyz[i,j,k] = p
+                for w in ti.static(range(3)):
+                    p2 = ti.Vector(ijk_to_xyz(i + (w == 0), j + (w == 1), k + (w == 2)))
+                    self.distance[i,j,k,w] = (p2 - p).norm()
+        make_coordinates()
+
+        # cell corners on the host, see ijk_to_xyz_host
+        i, j, k = np.indices(nodes)
+        self.xyz_host = np.stack(self.corner_xyz(i, j, k), axis=-1)
+
         @ti.func
         def channel_x_y_z(i,j,k):           
-            rx, ry, rz = ijk_to_xyz(i,j,k)
+            rx, ry, rz = self.xyz[i,j,k][0], self.xyz[i,j,k][1], self.xyz[i,j,k][2]
             x = rx / self.L_channel
             z = ((rz - self.unit_h_wall_real) / self.H_channel) - 0.5
             ry = ry % self.unit_width_real
@@ -312,18 +349,50 @@ class Geometry:
             return x, y, z
         
         self.channel_x_y_z = channel_x_y_z
+
+        # compact lists of the fluid nodes, and of the faces of the network (those of the nodes
+        # with i < nx-1, j < ny-1, k < nz-1, see lmd_model.face_current) whose resistance
+        # depends on Nu, so the temperature dependent parts are updated without full-grid passes
+        isfluid = self.isfluid.to_numpy()
+        interfaces = self.interfaces.to_numpy()[1:self.nx, 1:self.ny_faces+1, 1:self.nz] # offset, index 0 is -1
+        fluid_nodes = np.argwhere(isfluid == 0).astype(np.int32)
+        convective_faces = np.argwhere(interfaces != 0).astype(np.int32)
+        self.n_fluid = len(fluid_nodes)
+        self.n_convective = len(convective_faces)
+        self.fluid_nodes = ti.Vector.field(3, ti.i32, shape = max(self.n_fluid, 1))
+        self.convective_faces = ti.Vector.field(4, ti.i32, shape = max(self.n_convective, 1))
+        if self.n_fluid:
+            self.fluid_nodes.from_numpy(fluid_nodes)
+        if self.n_convective:
+            self.convective_faces.from_numpy(convective_faces)
+        self.temp_Nu = ti.field(ti.f32, shape = nodes,) # temp of the last Nu update
+        self.Nu_changed = ti.field(ti.i32, shape = nodes,)
+        self.n_Nu_changed = ti.field(ti.i32, shape = (1,)) # Nu updates since the host last reset it
         
-    def ijk_to_xyz_host(self,i, j, k):
+    def corner_xyz(self, i, j, k):
+        # lower corner of the cells of the full die, i, j, k may be integer arrays
         x = i * self.cell_L
     
         j0 = j % self.unit_width
-        nj = int(j / self.unit_width)
+        nj = j // self.unit_width
         k0 = k % self.unit_height
         
-        y = nj * self.unit_width_real + min(j0,self.unit_w_left)*self.solid_cell_W + min(max(j0-self.unit_w_left,0),self.unit_w_lr)*self.liquid_cell_W + max(j0-self.unit_w_right,0)*self.solid_cell_W
-        z = min(k0,self.unit_h_bottom)*self.solid_cell_H + min(max(k0-self.unit_h_bottom,0),self.unit_h_tb)*self.liquid_cell_H + max(k0-self.unit_h_top,0)*self.solid_cell_H
+        y = nj * self.unit_width_real + np.minimum(j0,self.unit_w_left)*self.solid_cell_W + np.minimum(np.maximum(j0-self.unit_w_left,0),self.unit_w_lr)*self.liquid_cell_W + np.maximum(j0-self.unit_w_right,0)*self.solid_cell_W
+        z = np.minimum(k0,self.unit_h_bottom)*self.solid_cell_H + np.minimum(np.maximum(k0-self.unit_h_bottom,0),self.unit_h_tb)*self.liquid_cell_H + np.maximum(k0-self.unit_h_top,0)*self.solid_cell_H
         return x, y, z
 
+    def ijk_to_xyz_host(self,i, j, k):
+        x, y, z = self.xyz_host[i,j,k]
+        return float(x), float(y), float(z)
+
+    def expand(self, a):
+        # Returns a node array (e.g. temp.to_numpy(), y along axis 1) of a reduced geometry
+        # (see symmetry) over all the columns of the die
+        a = np.asarray(a)
+        if self.symmetry is not None:
+            a = np.concatenate([a] * self.n_channel, axis=1)
+        return a
+
 if __name__ == '__main__':
     from lmd_geometry import Geometry
     ti.init()
@@ -4,24 +4,42 @@ from model.lmd_resistance_functions import solid_to_solid, solid_to_liquid, liqu
 # args: (solid/fluid, geometry, i1,j1,k1, i2,j2,k2, ie,je,ke,) (the two nodes to calculate the resistance between, and then the element index, note order-independent)
 
 
+@ti.func
+def face_resistance(solid: ti.template(), fluid: ti.template(), geometry: ti.template(), i: ti.i32, j: ti.i32, k: ti.i32, w: ti.i32):
+    i2, j2, k2 = i + (w == 0), (j + (w == 1)) % geometry.ny, k + (w == 2) # y wraps around on a reduced geometry
+    ie, je, ke = i, j, k
+
+    R = geometry.heat_resist[i, j, k, w]
+    if geometry.interfaces[ie, je, ke, w] == 0:  # Solid-solid interface
+        R = solid_to_solid(solid, geometry, i, j, k, i2, j2, k2, ie, je, ke, w)
+    elif geometry.interfaces[ie, je, ke, w] == 1:  # Solid-fluid interface
+        sl_bit = 0
+        if geometry.isfluid[i, j, k] != 0:
+            sl_bit = 1
+        R = solid_to_liquid(fluid, geometry, i, j, k, i2, j2, k2, ie, je, ke, w, sl_bit)
+    elif geometry.interfaces[ie, je, ke, w] == 2:  # Fluid-fluid interface
+        R = liquid_to_liquid(fluid, geometry, i, j, k, i2, j2, k2, ie, je, ke, w)
+    return R
+
 @ti.kernel
 def setup_heat_resistance(solid: ti.template(), fluid: ti.template(), geometry: ti.template()): 
     ti.loop_config(parallelize=8, block_dim=16)
     # fill in the heat_resist array from lmd_geometry as in lmd_fluid.py
     # @longvu
     for i, j, k, w in ti.ndrange(geometry.nx, geometry.ny, geometry.nz, geometry.nd):
-        i2, j2, k2 = i + (w == 0), j + (w == 1), k + (w == 2)
-        ie, je, ke = i, j, k
+        geometry.heat_resist[i, j, k, w] = face_resistance(solid, fluid, geometry, i, j, k, w)
 
-        if geometry.interfaces[ie, je, ke, w] == 0:  # Solid-solid interface
-            geometry.heat_resist[i, j, k, w] = solid_to_solid(solid, geometry, i, j, k, i2, j2, k2, ie, je, ke, w)
-        elif geometry.interfaces[ie, je, ke, w] == 1:  # Solid-fluid interface
-            sl_bit = 0
-            if geometry.isfluid[i, j, k] != 0:
-                sl_bit = 1
-            geometry.heat_resist[i, j, k, w] = solid_to_liquid(fluid, geometry, i, j, k, i2, j2, k2, ie, je, ke, w, sl_bit)
-        elif geometry.interfaces[ie, je, ke, w] == 2:  # Fluid-fluid interface
-            geometry.heat_resist[i, j, k, w] = liquid_to_liquid(fluid, geometry, i, j, k, i2, j2, k2, ie, je, ke, w)
+@ti.kernel
+def update_convective_resistance(solid: ti.template(), fluid: ti.template(), geometry: ti.template()):
+    # Recompute the Nu dependent (solid-fluid and fluid-fluid) resistances next to the nodes
+    # flagged by lmd_fluid.update_Nu; the solid-solid ones only depend on the geometry and
+    # keep the values of setup_heat_resistance
+    ti.loop_config(parallelize=8, block_dim=16)
+    for n in range(geometry.n_convective):
+        f = geometry.convective_faces[n]
+        i, j, k, w = f[0], f[1], f[2], f[3]
+        if geometry.Nu_changed[i, j, k] or geometry.Nu_changed[i + (w == 0), (j + (w == 1)) % geometry.ny, k + (w == 2)]:
+            geometry.heat_resist[i, j, k, w] = face_resistance(solid, fluid, geometry, i, j, k, w)
     
 
 @ti.kernel
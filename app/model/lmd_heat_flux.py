@@ -1,24 +1,41 @@
 import taichi as ti
+import numpy as np
 
 def setup_heat_flux(heat_flux_function, geometry): 
+    # spread the flux of each (i,j) column over its solid nodes, by volume
+    solid = geometry.isfluid.to_numpy() != 0 # if not fluid
+    volume = np.where(solid, geometry.volume.to_numpy(), 0.0)
+    vz = volume.sum(axis=2)
+    a = geometry.interface_area.to_numpy()[1:, 1:, 1, 2] # XY plane area (offset, index 0 is -1)
+
+    x, y = geometry.xyz_host[..., 0, 0], geometry.xyz_host[..., 0, 1] # same for every k
+    x0 = x / geometry.L_chip - 0.5
+    y0 = y / geometry.W_chip - 0.5
+    q = np.zeros((geometry.nx, geometry.ny))
     for i in range(geometry.nx):
         for j in range(geometry.ny):
-            vz = 0.0
-            for k in range(geometry.nz):
-                if geometry.isfluid[i,j,k] != 0: # if not fluid
-                    vz += geometry.volume[i,j,k]
-
-            if vz > 0.0:
-                a = geometry.interface_area[i,j,0,2] # XY plane area
-                for k in range(geometry.nz):
-                    if geometry.isfluid[i,j,k] != 0: # if not fluid
-                        x,y,z = geometry.ijk_to_xyz_host(i,j,k)
-                        x0 = x / geometry.L_chip - 0.5
-                        y0 = y / geometry.W_chip - 0.5
-                        geometry.heat_flux[i,j,k] = heat_flux_function(x0,y0) * a * geometry.volume[i,j,k] / vz
-                        #assumes W/m^2
+            if vz[i,j] > 0.0:
+                q[i,j] = heat_flux_function(x0[i,j], y0[i,j]) * a[i,j] / vz[i,j] #assumes W/m^2
             else:
                 print('Warning: no volume for heat flux at i,j = ', i, j)
+
+    geometry.heat_flux.from_numpy((q[:, :, None] * volume).astype(np.float32))
+
+def detect_symmetry(heat_flux_function, geometry, rtol=1e-6):
+    # Returns the symmetry of the heat flux map on the die of geometry (which may itself be
+    # reduced), to use as the symmetry of a Geometry: 'periodic' if every channel sees the
+    # same flux, else None
+    x, y, _ = geometry.corner_xyz(*np.indices((geometry.nx, geometry.ny_full, 1)))
+    x0 = x[..., 0] / geometry.L_chip - 0.5
+    y0 = y[..., 0] / geometry.W_chip - 0.5
+    q = np.array([[heat_flux_function(x0[i,j], y0[i,j]) for j in range(geometry.ny_full)]
+                  for i in range(geometry.nx)], dtype=np.float64)
+
+    atol = rtol * np.max(np.abs(q))
+    cells = q.reshape(geometry.nx, geometry.n_channel, geometry.unit_width)
+    if not np.allclose(cells, cells[:, :1], rtol=rtol, atol=atol):
+        return None
+    return 'periodic'
                     
 if __name__ == '__main__':
     from lmd_geometry import Geometry
@@ -5,36 +5,39 @@ if __name__ == '__main__':
 
 import taichi as ti
 import math
+import time
+import numpy as np
 from model.limits import limits
 from model.fluids import fluids, silicon as si # TODO Si parameters (@longvu)
-from model.lmd_fluid import setup_fluid_velocity, calculate_Re, calculate_Nu
+from model.lmd_fluid import setup_fluid_velocity, calculate_Re, calculate_Nu, update_Nu
 from model.lmd_heat_flux import setup_heat_flux
 from model.lmd_geometry import Geometry
-from model.lmd_heat import setup_heat_resistance, setup_nodal_heat_capacity, setup_temperature
-from tqdm import tqdm
+from model.lmd_heat import setup_heat_resistance, update_convective_resistance, setup_nodal_heat_capacity, setup_temperature
+from model.lmd_steady import solve_steady, MarchingSolver
+from model.lmd_acceleration import Anderson
 
 @ti.kernel
 def calculate_current(geometry: ti.template()):
     ti.loop_config(parallelize=8, block_dim=16)
     for i in range(geometry.nx-1):
-        for j in range(geometry.ny-1):
+        for j in range(geometry.ny_faces):
             for k in range(geometry.nz-1):
                 for w in range(geometry.nd):
-                    i2, j2, k2 = i + (w == 0), j + (w == 1), k + (w == 2)
+                    i2, j2, k2 = i + (w == 0), (j + (w == 1)) % geometry.ny, k + (w == 2)
                     geometry.current[i,j,k,w] += (geometry.temp[i,j,k] - geometry.temp[i2,j2,k2]) / geometry.heat_resist[i,j,k,w]
 
 @ti.kernel
 def propagate_current(T_in: ti.f32, fluid: ti.template(), geometry: ti.template()):
     ti.loop_config(parallelize=8, block_dim=16)
     # inlet # check this - not sure if it's correct
-    for j in range(geometry.ny-1):
+    for j in range(geometry.ny_faces):
         for k in range(geometry.nz-1):
             # inlet
             dm = fluid.rho * geometry.velocity[0,j,k,0] * geometry.interface_area[0,j,k,0] # should really be [-1,j,k,0], but this works since that is not set (auto set to 0)
             geometry.current[-1,j,k,0] = dm * fluid.cp * T_in
             
     for i in range(geometry.nx-1):
-        for j in range(geometry.ny-1):
+        for j in range(geometry.ny_faces):
             for k in range(geometry.nz-1):
                 for w in range(geometry.nd):
                     # m cp T flow
@@ -43,7 +46,7 @@ def propagate_current(T_in: ti.f32, fluid: ti.template(), geometry: ti.template(
                     geometry.current[i,j,k,w] += dm * fluid.cp * T
     # outlet
     lnx = geometry.nx-1 
-    for j in range(geometry.ny-1):
+    for j in range(geometry.ny_faces):
         for k in range(geometry.nz-1):
             T = geometry.temp[geometry.nx-1,j,k] # (at the outlet, the temperature is the same as the last node, since we don't care about exit heat balance...)
             dm = fluid.rho * geometry.velocity[geometry.nx-1,j,k,0] * geometry.interface_area[lnx,j,k,0]
@@ -57,8 +60,17 @@ def zero_current(geometry: ti.template()):
         geometry.current[i] = 0.0
 
 
+@ti.func
+def below_y(geometry: ti.template(), j: ti.i32):
+    # column before j, the last one for j = 0 when the y faces wrap around (see Geometry symmetry)
+    jm = j - 1
+    if ti.static(geometry.periodic_y):
+        if jm < 0:
+            jm = geometry.ny - 1
+    return jm
+
 @ti.kernel
-def calculate_temperature(geometry: ti.template()):
+def calculate_temperature(h: ti.f32, geometry: ti.template()):
     ti.loop_config(parallelize=8, block_dim=16)
     for i in range(geometry.nx):
         for j in range(geometry.ny):
@@ -66,21 +78,153 @@ def calculate_temperature(geometry: ti.template()):
                
                 flux = geometry.heat_flux[i,j,k] \
                     - geometry.current[i,j,k,0] + geometry.current[i-1,j,k,0] \
-                    - geometry.current[i,j,k,1] + geometry.current[i,j-1,k,1] \
+                    - geometry.current[i,j,k,1] + geometry.current[i,below_y(geometry, j),k,1] \
                     - geometry.current[i,j,k,2] + geometry.current[i,j,k-1,2]
                 geometry.net_flux[i,j,k] = flux 
-                geometry.temp_next[i,j,k] = (flux * (geometry.h / geometry.substep) / geometry.heat_capacity[i,j,k]) + geometry.temp[i,j,k]
+                geometry.temp_next[i,j,k] = (flux * h / geometry.heat_capacity[i,j,k]) + geometry.temp[i,j,k]
+
+@ti.func
+def face_current(T_in: ti.f32, fluid: ti.template(), geometry: ti.template(), i: ti.i32, j: ti.i32, k: ti.i32, w: ti.i32):
+    # heat current through the face between node (i,j,k) and its +w neighbour,
+    # the same value calculate_current and propagate_current store in geometry.current[i,j,k,w]
+    I = 0.0
+    if i >= 0 and i < geometry.nx-1 and j >= 0 and j < geometry.ny_faces and k >= 0 and k < geometry.nz-1:
+        i2, j2, k2 = i + (w == 0), (j + (w == 1)) % geometry.ny, k + (w == 2)
+        T = geometry.temp[i,j,k]
+        dm = fluid.rho * geometry.velocity[i,j,k,w] * geometry.interface_area[i,j,k,w]
+        I = (T - geometry.temp[i2,j2,k2]) / geometry.heat_resist[i,j,k,w] + dm * fluid.cp * T
+    elif w == 0 and j >= 0 and j < geometry.ny_faces and k >= 0 and k < geometry.nz-1:
+        if i == -1: # inlet
+            dm = fluid.rho * geometry.velocity[0,j,k,0] * geometry.interface_area[0,j,k,0]
+            I = dm * fluid.cp * T_in
+        elif i == geometry.nx-1: # outlet
+            dm = fluid.rho * geometry.velocity[i,j,k,0] * geometry.interface_area[i,j,k,0]
+            I = dm * fluid.cp * geometry.temp[i,j,k]
+    return I
+
+@ti.func
+def node_flux(T_in: ti.f32, fluid: ti.template(), geometry: ti.template(), i: ti.i32, j: ti.i32, k: ti.i32):
+    # net heat flow [W] into node (i,j,k), the sum of the currents through its six faces
+    flux = geometry.heat_flux[i,j,k]
+    for w in ti.static(range(3)):
+        jm = below_y(geometry, j) if ti.static(w == 1) else j
+        flux += face_current(T_in, fluid, geometry, i - (w == 0), jm, k - (w == 2), w) \
+            - face_current(T_in, fluid, geometry, i, j, k, w)
+    return flux
+
+@ti.kernel
+def fused_step(T_in: ti.f32, h: ti.f32, fluid: ti.template(), geometry: ti.template()):
+    # zero_current, calculate_current, propagate_current and calculate_temperature in one pass,
+    # each node sums the currents through its six faces without storing them in geometry.current
+    ti.loop_config(parallelize=8, block_dim=16)
+    for i in range(geometry.nx):
+        for j in range(geometry.ny):
+            for k in range(geometry.nz):
+                flux = node_flux(T_in, fluid, geometry, i, j, k)
+                geometry.net_flux[i,j,k] = flux
+                geometry.temp_next[i,j,k] = (flux * h / geometry.heat_capacity[i,j,k]) + geometry.temp[i,j,k]
+
+@ti.func
+def face_conductance(fluid: ti.template(), geometry: ti.template(), i: ti.i32, j: ti.i32, k: ti.i32, w: ti.i32):
+    # conduction (1/heat_resist) and advection (rho v A cp) conductance [W/K] of the face
+    # between node (i,j,k) and its +w neighbour, both zero where face_current has no face
+    c = 0.0
+    g = 0.0
+    if i >= 0 and i < geometry.nx-1 and j >= 0 and j < geometry.ny_faces and k >= 0 and k < geometry.nz-1:
+        c = 1.0 / geometry.heat_resist[i,j,k,w]
+        g = fluid.rho * geometry.velocity[i,j,k,w] * geometry.interface_area[i,j,k,w] * fluid.cp
+    elif w == 0 and j >= 0 and j < geometry.ny_faces and k >= 0 and k < geometry.nz-1:
+        i0 = ti.max(i, 0) # the inlet face uses the velocity of the first node
+        if i == -1 or i == geometry.nx-1:
+            g = fluid.rho * geometry.velocity[i0,j,k,0] * geometry.interface_area[i0,j,k,0] * fluid.cp
+    return c, g
+
+@ti.func
+def node_conductance(fluid: ti.template(), geometry: ti.template(), i: ti.i32, j: ti.i32, k: ti.i32):
+    # total conductance [W/K] of node (i,j,k), i.e. d(net outgoing current)/dT of the node:
+    # conduction through all its faces plus the advection leaving it
+    G = 0.0
+    for w in ti.static(range(3)):
+        c, g = face_conductance(fluid, geometry, i, j, k, w)
+        jm = below_y(geometry, j) if ti.static(w == 1) else j
+        c_in, _ = face_conductance(fluid, geometry, i - (w == 0), jm, k - (w == 2), w)
+        G += c + g + c_in
+    return G
+
+@ti.kernel
+def stable_time_step(fluid: ti.template(), geometry: ti.template()) -> ti.f32:
+    # largest stable explicit step [s], the smallest nodal RC time constant heat_capacity / conductance
+    h = 1e30
+    for i, j, k in ti.ndrange(geometry.nx, geometry.ny, geometry.nz):
+        G = node_conductance(fluid, geometry, i, j, k)
+        if G > 0.0:
+            ti.atomic_min(h, geometry.heat_capacity[i,j,k] / G)
+    return h
+
+@ti.kernel
+def local_step(T_in: ti.f32, cfl: ti.f32, fluid: ti.template(), geometry: ti.template()):
+    # fused_step where every node advances with cfl times its own RC time constant
+    # heat_capacity / node_conductance instead of one global step. Only the steady state
+    # is meaningful, the capacities cancel: temp += cfl * flux / conductance (damped Jacobi).
+    ti.loop_config(parallelize=8, block_dim=16)
+    for i in range(geometry.nx):
+        for j in range(geometry.ny):
+            for k in range(geometry.nz):
+                flux = node_flux(T_in, fluid, geometry, i, j, k)
+                G = node_conductance(fluid, geometry, i, j, k)
+                # a node without conductance has no step limit, it goes straight to the clamp of commit
+                dT = ti.math.sign(flux) * (373.15 - 273.15)
+                if G > 0.0:
+                    dT = cfl * flux / G
+                geometry.net_flux[i,j,k] = flux
+                geometry.temp_next[i,j,k] = geometry.temp[i,j,k] + dT
+
+@ti.kernel
+def sor_sweep(T_in: ti.f32, omega: ti.f32, color: ti.i32, fluid: ti.template(), geometry: ti.template()):
+    # SOR update in place of the nodes with (i + j + k) % 2 == color. Their neighbours all
+    # have the other color, so the nodes of one color are independent, and this sweep
+    # followed by the other color is one red-black Gauss-Seidel (omega = 1) iteration.
+    # node_conductance is the exact diagonal, so temp + flux / conductance zeroes the
+    # node's net flux. The color 0 sweep starts sum_temp, both add their sum |dT| to it.
+    # (On a periodic reduced geometry with an odd ny the wrap-around y faces join nodes of
+    # the same color, those pairs update like Jacobi.)
+    # Needs no temp_next buffer.
+    if color == 0:
+        geometry.sum_temp[0] = 0.0
+    ti.loop_config(parallelize=8, block_dim=16)
+    for i, j, kk in ti.ndrange(geometry.nx, geometry.ny, (geometry.nz + 1) // 2):
+        k = 2 * kk + (i + j + color) % 2
+        if k < geometry.nz:
+            flux = node_flux(T_in, fluid, geometry, i, j, k)
+            G = node_conductance(fluid, geometry, i, j, k)
+            dT = ti.math.sign(flux) * (373.15 - 273.15) # no conductance, straight to the clamp
+            if G > 0.0:
+                dT = omega * flux / G
+            T = geometry.temp[i,j,k]
+            new_T = ti.min(ti.max(T + dT, 273.15), 373.15)
+            geometry.net_flux[i,j,k] = flux
+            geometry.sum_temp[0] += ti.cast(ti.abs(new_T - T), ti.f64)
+            geometry.temp[i,j,k] = new_T
+
+@ti.kernel
+def copy_field(src: ti.template(), dst: ti.template()):
+    for I in ti.grouped(src):
+        dst[I] = src[I]
 
 @ti.kernel
 def commit(geometry: ti.template()):
+    # clamp and store temp_next, sum_temp is the f64 sum |dT| and max_temp the max |dT|
+    # (the atomic add / max are reduced per thread / block before they reach the global field)
     ti.loop_config(parallelize=8, block_dim=16)
     geometry.sum_temp[0] = 0.0
+    geometry.max_temp[0] = 0.0
     for i in range(geometry.nx):
         for j in range(geometry.ny):
             for k in range(geometry.nz):
                 new_T = ti.min(ti.max(geometry.temp_next[i,j,k],273.15),373.15)
                 dT = new_T - geometry.temp[i,j,k]
-                geometry.sum_temp[0] += ti.abs(dT)
+                geometry.sum_temp[0] += ti.cast(ti.abs(dT), ti.f64)
+                ti.atomic_max(geometry.max_temp[0], ti.abs(dT))
                 geometry.temp[i,j,k] = new_T
 
 class MicroChannelCooler:
@@ -91,6 +235,39 @@ class MicroChannelCooler:
         # T_in : fluid inlet temperature [K]
         # heat_flux_function : function of (x,y,t) that returns heat flux [W/m^2]
         # Q : fluid flow rate [uL/min]
+        # nit : maximum number of iterations
+        # diagnostics : if True, run the unfused substep kernels, which leave the
+        #               face currents in geometry.current
+        # method : 'explicit' pseudo-time stepping, 'sor' for red-black SOR sweeps (see
+        #          sor_sweep), 'steady' to solve the steady state network directly
+        #          (see lmd_steady.solve_steady), or 'march' to solve it by marching
+        #          along the flow (see lmd_steady.MarchingSolver), for fast screening
+        # linear_solver : linear solver of the 'steady' method, see lmd_steady.linear_solvers
+        # axial_corrections : axial conduction correction passes of the 'march' method per
+        #                     Picard iteration, 0 to neglect the conduction downstream,
+        #                     1 or more to converge to the 'steady' solution
+        # adaptive : if True, the 'explicit' step is derived from the stable_time_step of the
+        #            network instead of geometry.h, grown while the residual decreases, and
+        #            rolled back and shrunk when it diverges
+        # local_time_step : if True, every node of the 'explicit' method advances with its own
+        #                   stable step (see local_step), which only preserves the steady state
+        # omega : SOR relaxation factor of the 'sor' method, None to estimate it from the
+        #         convergence rate of the first Gauss-Seidel iterations
+        # anderson : history depth of the Anderson acceleration of the 'explicit' or 'sor'
+        #            iterations (see lmd_acceleration.Anderson), 0 to disable
+        # local_tolerance : estimated temperature error [K] at which local time stepping stops,
+        #                   the max |dT| of an iteration over the contraction 1 - rho per iteration
+        # Nu_tolerance : temperature change [K] of a fluid node that triggers the update of its
+        #                Nu and convective resistances (Nu changes by ~0.1 % per K)
+        # check_every : iterations between reads of the residual on the host (convergence,
+        #               step and omega control), the kernels run ahead in between
+        # progress : optional callback, called with [iteration, nit, dT] at most every
+        #            progress_interval seconds, instead of printing the iterations; the
+        #            'steady' and 'march' methods call it with [Picard iteration, max_picard]
+        #
+        # solver_info holds the info of the last 'steady' or 'march' solve (see
+        # lmd_steady.solve_steady), with the Picard and linear solver iterations,
+        # residual histories and multigrid levels
         
         # 500*math.exp((-x**2-y**2)*4)
         
@@ -102,6 +279,19 @@ class MicroChannelCooler:
             'fluid' : fluids[0],
             'solid': si,
             'nit': 400000,
+            'diagnostics': False,
+            'method': 'explicit',
+            'linear_solver': 'direct',
+            'axial_corrections': 0,
+            'adaptive': False,
+            'local_time_step': False,
+            'omega': None,
+            'anderson': 0,
+            'local_tolerance': 0.01,
+            'Nu_tolerance': 0.1,
+            'check_every': 10,
+            'progress': None,
+            'progress_interval': 1.0,
         } 
         param.update(kwargs)
         self.param = param
@@ -120,6 +310,8 @@ class MicroChannelCooler:
         
         for key, val in param.items():
             setattr(self, key, val)                   
+
+        self.solver_info = None
                     
     def main(self, **kwargs):  # sourcery skip: extract-duplicate-method
                         
@@ -128,23 +320,145 @@ class MicroChannelCooler:
         setup_heat_flux(self.heat_flux_function, self.geometry)
         setup_nodal_heat_capacity(self.solid, self.fluid, self.geometry)
         setup_temperature(self.geometry)
-    
+
+        if self.method in ('steady', 'march'):
+            linear_solver = self.linear_solver
+            if self.method == 'march':
+                shape = (self.geometry.nx, self.geometry.ny, self.geometry.nz)
+                linear_solver = MarchingSolver(shape, corrections=self.axial_corrections)
+            info = solve_steady(self.T_in, self.solid, self.fluid, self.geometry, linear_solver=linear_solver, progress=self.progress)
+            self.solver_info = info
+            if info['converged']:
+                print('Converged in', info['iterations'], 'Picard iterations, with final change dT =', info['change'])
+            else:
+                print('Failed to converge in', info['iterations'], 'Picard iterations, with final change dT =', info['change'])
+            return info
+        elif self.method not in ('explicit', 'sor'):
+            raise ValueError("Invalid method, must be 'explicit', 'sor', 'steady' or 'march'")
+        omega = self.omega or 1.0
+        it_omega, dt_omega, estimated = None, math.inf, False
+        it_max, dt_max, estimate_ok = None, 0.0, False
+
+        h0 = self.geometry.h / self.geometry.substep
+        h = h0
+        # adaptive step, as a fraction of stable_time_step; that bound (Gershgorin) is
+        # conservative, so the step may grow past it while it stays stable, up to
+        # scale_max, which is lowered every time a step diverges
+        scale, scale_max = 1.0, 2.0
+        r_last, r_save, it_save = math.inf, math.inf, 0
+        copy_field(self.geometry.temp, self.geometry.temp_save)
+
+        # Anderson extrapolation of temp on the check iterations, where the host syncs anyway;
+        # the check_every iterations (Nu updates and smoothing steps) between two of them are
+        # one application of the fixed-point map
+        acceleration = Anderson(self.anderson) if self.anderson else None
+        x = None # temp after the last extrapolation
+
+        calculate_Nu(self.fluid, self.geometry)
+        setup_heat_resistance(self.solid, self.fluid, self.geometry)
+
+        # the stable step only changes with the resistances, it is recomputed after the
+        # check iterations that find Nu (and so the resistances) updated
+        h_stable = None
+
         dt0 = 500.0
-        for it in tqdm(range(self.nit)):
-            calculate_Nu(self.fluid, self.geometry)
-            setup_heat_resistance(self.solid, self.fluid, self.geometry)
+        t_report = -math.inf
+        for it in range(self.nit):
+            update_Nu(self.fluid, self.geometry, self.Nu_tolerance)
+            update_convective_resistance(self.solid, self.fluid, self.geometry)
+            if self.adaptive:
+                if h_stable is None:
+                    h_stable = stable_time_step(self.fluid, self.geometry)
+                h = scale * h_stable
+
+            # the local steps are a fraction cfl of each node's own stable step, damped
+            # (like the global one) so the checkerboard modes of the grid still decay
+            cfl = 0.7 * scale if self.adaptive else 0.7
 
             for _ in range(self.geometry.substep):
-                zero_current(self.geometry)
-                calculate_current(self.geometry)
-                propagate_current(self.T_in, self.fluid,self.geometry) # adjust current to account for fluid motion
-                calculate_temperature(self.geometry)
-                commit(self.geometry)
-                dt = self.geometry.sum_temp[0]
-                
+                self.step(h, cfl, omega)
+
+            # the kernels run ahead of the host, which only waits for the residual here
+            if it != 1 and it % self.check_every != 0 and it != self.nit - 1:
+                continue
+            dt = self.geometry.sum_temp[0]
+
+            if acceleration is not None and it % self.check_every == 0:
+                g = self.geometry.temp.to_numpy().astype(np.float64)
+                if x is not None:
+                    g = np.clip(acceleration(x, g), 273.15, 373.15).astype(np.float32) # the clamp of commit
+                    self.geometry.temp.from_numpy(g)
+                x = g.astype(np.float64)
+
+            if self.adaptive and self.geometry.n_Nu_changed[0] > 0:
+                self.geometry.n_Nu_changed[0] = 0
+                h_stable = None
+
+            if self.adaptive:
+                r = dt / h # rate of change [K/s], comparable between step sizes
+                if not math.isfinite(r) or r > 10.0 * r_save:
+                    # diverging, go back to the last snapshot with half the step
+                    copy_field(self.geometry.temp_save, self.geometry.temp)
+                    if acceleration is not None:
+                        acceleration.reset()
+                        x = None
+                    scale_max = 0.9 * scale
+                    scale *= 0.5
+                    r_last = math.inf
+                    if scale < 1e-3:
+                        print('Exploded within in', it+1, 'iterations, with no stable step-size left.')
+                        return
+                    print('Iteration', it+1, 'diverged, rolled back with step-size h =', scale, 'x stable step')
+                    continue
+                if r < r_last:
+                    scale = min(scale * 1.05, scale_max)
+                r_last = r
+                if it - it_save >= 100 or it == 0:
+                    copy_field(self.geometry.temp, self.geometry.temp_save)
+                    r_save, it_save = r, it
+                dt = r * h0 # as if stepped with geometry.h, for the checks below
+
+            if self.method == 'sor' and self.omega is None and it >= 50:
+                # Gauss-Seidel contracts by rho_J^2 per iteration, which gives the optimal
+                # SOR factor 2 / (1 + sqrt(1 - rho_J^2)) (Young). That overshoots for the
+                # non-symmetric (advective) network, so omega is halved towards 1 whenever
+                # 50 iterations pass without a drop of dT.
+                if it_omega is None:
+                    it_omega, dt_omega = it, dt
+                elif it - it_omega >= 50:
+                    if not estimated and dt_omega > 0.0:
+                        rho = min((dt / dt_omega)**(1/(it - it_omega)), 1.0)
+                        omega = min(2.0 / (1.0 + math.sqrt(1.0 - rho)), 1.9)
+                        estimated = True
+                    elif dt >= dt_omega:
+                        omega = 1.0 + 0.5 * (omega - 1.0)
+                    it_omega, dt_omega = it, dt
+
             if it==1:
                 dt0 = dt
-            if it > 1000 and ((dt < 0.01*dt0 and dt < 1e9*self.geometry.h) or dt < 0.04):
+            if self.method == 'explicit' and self.local_time_step:
+                # the local steps are damped Jacobi iterations, which shrink the max |dT| by
+                # rho per iteration, so max |dT| * rho / (1 - rho) estimates the remaining
+                # error, trusted when two checks in a row agree (the first iterations drop
+                # much faster than the slowest mode); once the max |dT| is down to the f32
+                # round-off of temp nothing moves
+                dt_now = float(self.geometry.max_temp[0])
+                converged = False
+                if it_max is not None and dt_max > 0.0:
+                    rho = (dt_now / dt_max)**(1/(it - it_max))
+                    ok = rho < 1.0 and dt_now * rho / (1.0 - rho) < self.local_tolerance
+                    converged = dt_now <= np.spacing(np.float32(373.15)) or (ok and estimate_ok)
+                    estimate_ok = ok
+                it_max, dt_max = it, dt_now
+            else:
+                # the first SOR steps are no reference for the drop
+                relative = self.method == 'explicit'
+                # the pseudo-time transient of the plain explicit steps needs a floor of
+                # iterations before its dT means anything, the SOR sweeps and the accelerated
+                # iterations stop as soon as dT is small
+                min_it = 1000 if self.method == 'explicit' and acceleration is None else 1
+                converged = it > min_it and ((relative and dt < 0.01*dt0 and dt < 1e9*self.geometry.h) or dt < 0.04)
+            if converged:
                 print('Converged in', it+1, 'iterations, with final step-size dT =', float(dt))
                 return
             elif it > self.nit*0.1 and dt/dt0 > 0.9:
@@ -153,13 +467,33 @@ class MicroChannelCooler:
                 else:
                     print('Exploded within in', it+1, 'iterations, with step-size dT =', float(dt), '\n Please check your timestep, spatial resolution, and heat-flux magnitude to improve stability.')
                 return
-            print('Iteration', it+1, 'completed with step-size dT =', float(dt))
-            
-                
-                
-                
-    
-    
+
+            if time.time() - t_report >= self.progress_interval:
+                t_report = time.time()
+                if self.progress:
+                    self.progress([str(it), str(self.nit), str(dt)])
+                else:
+                    print('Iteration', it+1, 'completed with step-size dT =', float(dt))
+
+    def step(self, h, cfl=0.7, omega=1.0):
+        # Advance the temperature by one explicit step h [s], or cfl times the local
+        # stable steps if local_time_step is set, or one SOR iteration with factor omega
+        # for the 'sor' method. The sum of |dT| [K] is left in geometry.sum_temp.
+        if self.method == 'sor':
+            sor_sweep(self.T_in, omega, 0, self.fluid, self.geometry)
+            sor_sweep(self.T_in, omega, 1, self.fluid, self.geometry)
+            return
+        elif self.local_time_step:
+            local_step(self.T_in, cfl, self.fluid, self.geometry)
+        elif self.diagnostics:
+            zero_current(self.geometry)
+            calculate_current(self.geometry)
+            propagate_current(self.T_in, self.fluid,self.geometry) # adjust current to account for fluid motion
+            calculate_temperature(h, self.geometry)
+        else:
+            fused_step(self.T_in, h, self.fluid, self.geometry)
+        commit(self.geometry)
+
     def solve(self, make_fields=False):
         
         self.main(**self.geometry.__dict__,
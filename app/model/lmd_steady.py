@@ -0,0 +1,310 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu, gmres, LinearOperator
+from model.lmd_fluid import calculate_Nu
+from model.lmd_heat import setup_heat_resistance
+
+# Steady state of the lumped network that lmd_model.MicroChannelCooler.main time-steps.
+# With Nu held fixed every face current (see lmd_model.face_current) is linear in temp,
+#   conduction  (T_a - T_b) / heat_resist[a,w]  and advection  rho * v * A * cp * T_a,
+# so the steady balance  heat_flux + sum(currents in) - sum(currents out) = 0  is a sparse
+# linear system A T = b. The temperature dependence of Nu is handled by Picard iteration,
+# and the clamp of commit by pinning the nodes it holds at a limit (an active set).
+
+T_min, T_max = 273.15, 373.15 # the clamp applied in lmd_model.commit
+
+def assemble_system(T_in, fluid, geometry):
+    # Returns the sparse matrix A (csr, nn x nn) and right hand side b of the steady balance,
+    # nodes are numbered in C order of (i,j,k); uses the current heat_resist field
+    nx, ny, nz = geometry.nx, geometry.ny, geometry.nz
+    index = np.arange(geometry.nn).reshape(nx, ny, nz)
+
+    # offset fields, index 0 is -1
+    R = geometry.heat_resist.to_numpy()[1:, 1:, 1:].astype(np.float64)
+    area = geometry.interface_area.to_numpy()[1:, 1:, 1:].astype(np.float64)
+    v = geometry.velocity.to_numpy().astype(np.float64)
+    rho_cp = fluid.rho * fluid.cp
+
+    rows, cols, vals = [], [], []
+    def add(r, c, x):
+        rows.append(r.ravel()); cols.append(c.ravel()); vals.append(np.broadcast_to(x, r.shape).ravel())
+
+    # faces from the nodes with i < nx-1, j < ny_faces, k < nz-1 (as in calculate_current),
+    # the y neighbours wrap around on a reduced geometry
+    ny_faces = geometry.ny_faces
+    a = (slice(0, nx-1), slice(0, ny_faces), slice(0, nz-1))
+    for w in range(geometry.nd):
+        b = np.ix_(np.arange(nx-1) + (w == 0), (np.arange(ny_faces) + (w == 1)) % ny, np.arange(nz-1) + (w == 2))
+        ia, ib = index[a], index[b]
+        c = 1.0 / R[a + (w,)]
+        g = rho_cp * v[a + (w,)] * area[a + (w,)]
+        add(ia, ia, c + g); add(ia, ib, -c)     # current out of a
+        add(ib, ia, -(c + g)); add(ib, ib, c)   # current into b
+
+    # outlet, advection out of the last x plane
+    edge = (slice(0, ny_faces), slice(0, nz-1))
+    g_out = rho_cp * v[(nx-1,) + edge + (0,)] * area[(nx-1,) + edge + (0,)]
+    add(index[(nx-1,) + edge], index[(nx-1,) + edge], g_out)
+
+    A = sp.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                      shape=(geometry.nn, geometry.nn))
+
+    b = geometry.heat_flux.to_numpy().astype(np.float64).ravel()
+    g_in = rho_cp * v[(0,) + edge + (0,)] * area[(0,) + edge + (0,)] # inlet, advection at T_in
+    b[index[(0,) + edge].ravel()] += g_in.ravel() * T_in
+
+    return A, b
+
+def fix_nodes(A, b, fixed, value):
+    # Replace the rows of the fixed nodes by T = value
+    free = sp.diags((~fixed).astype(np.float64))
+    return (free @ A + sp.diags(fixed.astype(np.float64))).tocsr(), np.where(fixed, value, b)
+
+class DirectSolver:
+
+    def __init__(self, shape=None, permc_spec='MMD_AT_PLUS_A', rtol=1e-10, maxiter=20):
+        # Initialize DirectSolver, a sparse LU (SuperLU) solve of A T = b
+        #
+        # The Picard matrices only differ by the change of Nu, so the factors of an earlier
+        # matrix are kept and used to precondition GMRES on the next ones; the matrix is
+        # only factored again when that takes more than maxiter iterations.
+        #
+        # shape : (nx, ny, nz) of the node grid, not needed by the factorization
+        # permc_spec : SuperLU column ordering (the matrix is nearly structurally symmetric)
+        # rtol : relative residual of the preconditioned GMRES solves
+
+        self.permc_spec = permc_spec
+        self.rtol = rtol
+        self.maxiter = maxiter
+        self.lu = None
+
+    def factor(self, A):
+        self.lu = splu(A.tocsc(), permc_spec=self.permc_spec)
+
+    def __call__(self, A, b, x0=None):
+        # Returns the solution and an info dict with the 'iterations' and 'residuals'
+        if self.lu is not None:
+            residuals = []
+            M = LinearOperator(A.shape, self.lu.solve)
+            T, status = gmres(A, b, x0=x0, rtol=self.rtol, atol=0.0, restart=self.maxiter, maxiter=1, M=M,
+                              callback=residuals.append, callback_type='pr_norm')
+            if status == 0:
+                return T, {'iterations': len(residuals), 'residuals': residuals, 'factored': False}
+
+        self.factor(A)
+        return self.lu.solve(b), {'iterations': 1, 'residuals': [], 'factored': True}
+
+class MultigridGMRES:
+
+    def __init__(self, shape, rtol=1e-10, restart=50, maxiter=20, nu=1, permc_spec='MMD_AT_PLUS_A'):
+        # Initialize MultigridGMRES, GMRES preconditioned by one geometric multigrid V-cycle
+        #
+        # The network couples strongly within a y-z plane (conduction through the thin cells)
+        # and weakly along x, apart from the advection. So the smoother is block Gauss-Seidel
+        # over the x planes, each plane solved exactly (a 2-D factorization), sweeping
+        # downstream before and upstream after the coarse grid correction, and the grids
+        # are coarsened in x only, by merging pairs of planes (piecewise constant
+        # prolongation P, Galerkin coarse matrices P^T A P), down to two planes, which
+        # are solved directly. Only 2-D factorizations are kept, so the memory grows with
+        # the node count instead of the fill of a 3-D factorization.
+        #
+        # shape : (nx, ny, nz) of the node grid, nodes numbered in C order of (i,j,k)
+        # rtol : relative residual of the GMRES solve
+        # restart, maxiter : GMRES restart length and number of restarts
+        # nu : smoothing sweeps before and after each coarse grid correction
+
+        self.shape = tuple(shape)
+        self.rtol = rtol
+        self.restart = restart
+        self.maxiter = maxiter
+        self.nu = nu
+        self.permc_spec = permc_spec
+        self.levels = []
+
+    def setup(self, A):
+        # Build the grid hierarchy of A
+        self.levels = []
+        nx, m = self.shape[0], self.shape[1] * self.shape[2] # planes, nodes per plane
+        A = A.tocsr()
+        while True:
+            level = {'A': A, 'nx': nx, 'm': m}
+            if nx <= 2:
+                level['lu'] = splu(A.tocsc(), permc_spec=self.permc_spec)
+                self.levels.append(level)
+                break
+            planes = [slice(i * m, (i + 1) * m) for i in range(nx)]
+            level['rows'] = [A[s] for s in planes]
+            level['blocks'] = [A[s, s] for s in planes]
+            level['lu'] = [splu(block.tocsc(), permc_spec=self.permc_spec) for block in level['blocks']]
+
+            nx_coarse = (nx + 1) // 2
+            fine = np.arange(nx * m)
+            coarse = (fine // m) // 2 * m + fine % m
+            P = sp.csr_matrix((np.ones(nx * m), (fine, coarse)), shape=(nx * m, nx_coarse * m))
+            level['P'] = P
+            self.levels.append(level)
+            A = (P.T @ A @ P).tocsr()
+            nx = nx_coarse
+
+    def smooth(self, level, b, x, planes):
+        # block Gauss-Seidel over the given planes, in order
+        m = level['m']
+        for i in planes:
+            s = slice(i * m, (i + 1) * m)
+            r = b[s] - level['rows'][i] @ x + level['blocks'][i] @ x[s]
+            x[s] = level['lu'][i].solve(r)
+        return x
+
+    def vcycle(self, b, l=0):
+        level = self.levels[l]
+        if l == len(self.levels) - 1:
+            return level['lu'].solve(b)
+
+        nx = level['nx']
+        x = np.zeros(len(b))
+        for _ in range(self.nu):
+            x = self.smooth(level, b, x, range(nx))
+        r = b - level['A'] @ x
+        x += level['P'] @ self.vcycle(level['P'].T @ r, l + 1)
+        for _ in range(self.nu):
+            x = self.smooth(level, b, x, range(nx - 1, -1, -1))
+        return x
+
+    def __call__(self, A, b, x0=None):
+        # Returns the solution and an info dict with the GMRES 'iterations', the
+        # preconditioned 'residuals' history and the number of grid 'levels'
+        self.setup(A)
+        residuals = []
+        M = LinearOperator(A.shape, self.vcycle, dtype=np.float64)
+        T, status = gmres(A, b, x0=x0, rtol=self.rtol, atol=0.0, restart=self.restart, maxiter=self.maxiter, M=M,
+                          callback=residuals.append, callback_type='pr_norm')
+        if status != 0:
+            print('Warning: multigrid GMRES did not converge in', len(residuals), 'iterations, residual =', residuals[-1])
+        return T, {'iterations': len(residuals), 'residuals': residuals, 'levels': len(self.levels)}
+
+class MarchingSolver:
+
+    def __init__(self, shape, corrections=0, permc_spec='MMD_AT_PLUS_A'):
+        # Initialize MarchingSolver, a space march of A T = b along x (the flow direction)
+        #
+        # The fluid only flows in +x and the axial conduction is small next to the
+        # advection, so the planes are solved in turn from the inlet, each a 2-D (y-z)
+        # problem fed by the plane upstream, as naive_model marches its elements. The
+        # conduction to the plane downstream, not known yet, is taken with a zero axial
+        # gradient (T of the next plane = T of this one).
+        #
+        # With corrections, the march is instead used to correct the previous iterate x0
+        # (the last Picard iterate of solve_steady): each pass marches the residual
+        # b - A T, which adds back the axial conduction, so the Picard iterations converge
+        # to the solution of the full network rather than of the march.
+        #
+        # shape : (nx, ny, nz) of the node grid, nodes numbered in C order of (i,j,k)
+        # corrections : number of axial conduction correction passes per solve, 0 for the
+        #               plain march
+
+        self.shape = tuple(shape)
+        self.corrections = corrections
+        self.permc_spec = permc_spec
+
+    def setup(self, A):
+        # factor the plane blocks of the march
+        nx, m = self.shape[0], self.shape[1] * self.shape[2] # planes, nodes per plane
+        A = A.tocsr()
+        planes = [slice(i * m, (i + 1) * m) for i in range(nx)]
+        self.lower = [None] + [A[planes[i], planes[i - 1]] for i in range(1, nx)]
+        self.lu = []
+        for i in range(nx):
+            block = A[planes[i], planes[i]]
+            if i < nx - 1:
+                block = block + A[planes[i], planes[i + 1]] # zero axial gradient downstream
+            self.lu.append(splu(block.tocsc(), permc_spec=self.permc_spec))
+        self.planes = planes
+
+    def march(self, b):
+        T = np.zeros(len(b))
+        for i, s in enumerate(self.planes):
+            r = b[s] if i == 0 else b[s] - self.lower[i] @ T[self.planes[i - 1]]
+            T[s] = self.lu[i].solve(r)
+        return T
+
+    def __call__(self, A, b, x0=None):
+        # Returns the solution and an info dict with the number of 'iterations' (marches)
+        # and the relative 'residuals' of A T = b after each of them
+        self.setup(A)
+        norm = np.linalg.norm(b) or 1.0
+        if self.corrections == 0 or x0 is None:
+            T = self.march(b)
+            residuals = [np.linalg.norm(b - A @ T) / norm]
+        else:
+            T, residuals = np.array(x0, dtype=np.float64), []
+        while len(residuals) <= self.corrections:
+            T += self.march(b - A @ T)
+            residuals.append(np.linalg.norm(b - A @ T) / norm)
+        return T, {'iterations': len(residuals), 'residuals': residuals}
+
+# linear solver factories, an instance is created per solve_steady call with the grid shape
+linear_solvers = {
+    'direct': DirectSolver,
+    'multigrid': MultigridGMRES,
+    'march': MarchingSolver,
+}
+
+def solve_steady(T_in, solid, fluid, geometry, linear_solver='direct', tol=1e-4, max_picard=50, progress=None):
+    # Solve for the steady temperature field in place (geometry.temp)
+    #
+    # T_in : fluid inlet temperature [K]
+    # linear_solver : a name in linear_solvers, or a function (A, b, x0) -> (T, info)
+    # tol : Picard tolerance, max change of any node temperature between iterations [K]
+    # max_picard : maximum number of Picard (Nu update) iterations
+    # progress : optional callback, called with [iteration, max_picard] after each iteration
+    #
+    # Returns
+    # info : dict with the Picard 'iterations', final temperature 'change' [K], 'converged'
+    #        and the 'linear' info of every linear solve
+
+    if isinstance(linear_solver, str):
+        solve = linear_solvers[linear_solver]((geometry.nx, geometry.ny, geometry.nz))
+    else:
+        solve = linear_solver
+    T = geometry.temp.to_numpy().astype(np.float64).ravel()
+    upper = np.zeros(geometry.nn, dtype=bool) # nodes held at T_max / T_min by the clamp
+    lower = np.zeros(geometry.nn, dtype=bool)
+    info = {'iterations': 0, 'change': np.inf, 'converged': False, 'linear': []}
+
+    for it in range(max_picard):
+        calculate_Nu(fluid, geometry)
+        setup_heat_resistance(solid, fluid, geometry)
+        A, b = assemble_system(T_in, fluid, geometry)
+
+        # nodes without any face (e.g. the last x plane at j = ny-1) only heat up or cool
+        # down until they are clamped, or keep their temperature if they have no heat flux
+        floating = A.diagonal() == 0.0
+        upper |= floating & (b > 0.0)
+        lower |= floating & (b < 0.0)
+        fixed = floating | upper | lower
+        value = np.where(upper, T_max, np.where(lower, T_min, T))
+
+        T_new, linear_info = solve(*fix_nodes(A, b, fixed, value), T)
+
+        # release clamped nodes whose balance pulls them back inside the limits,
+        # and clamp the nodes that left them
+        r = b - A @ T_new
+        upper_new = (T_new > T_max) | (upper & (r > 0.0))
+        lower_new = (T_new < T_min) | (lower & (r < 0.0))
+        active = np.any(upper_new != upper) or np.any(lower_new != lower)
+        upper, lower = upper_new, lower_new
+        T_new = np.clip(T_new, T_min, T_max)
+
+        change = float(np.max(np.abs(T_new - T)))
+        T = T_new
+        geometry.temp.from_numpy(T.reshape(geometry.nx, geometry.ny, geometry.nz).astype(np.float32))
+
+        info['linear'].append(linear_info)
+        info.update(iterations=it + 1, change=change)
+        if progress:
+            progress([str(it), str(max_picard)])
+        if change < tol and not active:
+            info['converged'] = True
+            break
+
+    return info
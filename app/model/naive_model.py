@@ -1,14 +1,99 @@
 #!/bin/python3
 
+import os
+import math
+import numbers
+import functools
 import numpy as np
 import matplotlib.pyplot as plt
 from model.fluids import Fluid, water
 
+try:
+    from numba import njit
+except ImportError: # numba is optional, the march falls back to plain Python
+    njit = None
+
+backends = ['python', 'numba']
+
+def _march(T_in, T_w, N_ELE, m, GD, D, PdL,
+           mu, cp, k, T_boiling_point, latent_heat_of_vaporization,
+           T_ref, mu_B, dcp_dT, dk_dT):
+    # Step the fluid temperature through the channel one element at a time,
+    # with the fluid properties, h and cp evaluated at each element's inlet
+    # temperature
+    #
+    # m : fluid mass flow rate [kg/s]
+    # GD : mass flux times hydraulic diameter, i.e. Re * mu [kg/m*s]
+    # D : hydraulic diameter [m]
+    # PdL : element wetted area, perimeter times element length [m^2]
+    # mu, cp, k : fluid properties at T_ref, see naive_model
+    # T_ref, mu_B, dcp_dT, dk_dT : temperature dependence, see naive_model
+    #
+    # Returns
+    # T : the element temperatures [K]
+    # E : the total heat transfer [W]
+    # mu_ratio : mean of mu(T) / mu over the elements, scales the pressure loss
+
+    T = np.empty(N_ELE)
+    T[0] = T_in
+    E = 0.0
+    mu_sum = 0.0
+
+    mu_w = mu * math.exp(mu_B * (1 / T_w - 1 / T_ref)) # viscosity at the wall [Pa*s]
+
+    for i in range(1, N_ELE):
+
+        T_in_ = T[i-1] # element inlet temperature [K]
+
+        mu_ = mu * math.exp(mu_B * (1 / T_in_ - 1 / T_ref)) # Andrade viscosity [Pa*s]
+        cp_ = cp + dcp_dT * (T_in_ - T_ref) # heat capacity [J/kg*K]
+        k_ = k + dk_dT * (T_in_ - T_ref) # thermal conductivity [W/m*K]
+
+        Re = GD / mu_ # Reynolds number
+        Pr = cp_ * mu_ / k_ # Prandtl number
+        fT = (1 + cp_ * (T_w - T_boiling_point) / latent_heat_of_vaporization)**(-2/3) # Zhuifu model (2013)
+        Nu = (2 + 0.552 * Re**0.5 * Pr**(1/3)) * fT # Nusselt number
+        Nu *= (mu_ / mu_w)**0.14 # Sieder-Tate (1956) correction
+
+        hA = Nu * k_ / D * PdL # element conductance [W/K]
+        mcp = m * cp_ # fluid heat capacity rate [W/K]
+
+        dE = hA * (T_w - T_in_) # heat transfer [W]
+        T_out = (dE / mcp) + T_in_ # element outlet temperature [K]
+
+        T[i] = T_out
+        E += dE
+        mu_sum += mu_ / mu
+
+    mu_ratio = mu_sum / (N_ELE - 1) if N_ELE > 1 else 1.0
+
+    return T, E, mu_ratio
+
+_march_numba = njit(cache=True)(_march) if njit is not None else None
+
+def get_march(backend=None):
+    # Returns the element march kernel for the requested backend
+    #
+    # backend : 'python' or 'numba', defaults to the NAIVE_MODEL_BACKEND
+    #           environment variable, or 'python' if that is not set.
+    #           'numba' falls back to 'python' when numba is not installed.
+
+    if backend is None:
+        backend = os.environ.get('NAIVE_MODEL_BACKEND', 'python')
+
+    if backend not in backends:
+        raise ValueError(f"Invalid backend, must be one of {backends}")
+
+    if backend == 'numba' and _march_numba is not None:
+        return _march_numba
+    return _march
+
 def naive_model(T_in, T_w, Q,
                 L, W, H,
                 rho, mu, cp, k, T_boiling_point,
                 latent_heat_of_vaporization,              
-                make_fields=False, N_ELE=1000, **kwargs):
+                make_fields=False, N_ELE=1000, method='closed', backend=None,
+                T_ref=298.15, mu_B=0.0, dcp_dT=0.0, dk_dT=0.0, **kwargs):
     # Calculate the heat transfer in a rectangular microchannel with the specified
     # properties using a 1-dimensional enthalpy heat transfer model
     #
@@ -22,6 +107,16 @@ def naive_model(T_in, T_w, Q,
     # T_in : fluid temperature at inlet [K]
     # T_w : wall temperature [K]
     # Q : fluid flow rate [uL/min]
+    # method : 'closed' to evaluate the element march in closed form,
+    #          'march' to step through the elements one at a time
+    # backend : kernel used by the 'march' method, see get_march
+    # T_ref : temperature of the given rho, mu, cp and k [K]
+    # mu_B : Andrade activation temperature, mu(T) = mu * exp(mu_B * (1/T - 1/T_ref)) [K]
+    # dcp_dT : heat capacity slope, cp(T) = cp + dcp_dT * (T - T_ref) [J/kg*K^2]
+    # dk_dT : thermal conductivity slope, k(T) = k + dk_dT * (T - T_ref) [W/m*K^2]
+    #         the 'march' method evaluates mu, cp, k, h (with the Sieder-Tate
+    #         correction) and the pressure loss at each element's temperature;
+    #         the 'closed' method needs constant properties (all three zero)
     #
     # Returns
     # q : the heat flux [W/cm2]
@@ -60,28 +155,238 @@ def naive_model(T_in, T_w, Q,
     dP = ( f * L * rho * (v**2) ) / ( 2 * H ) # pressure loss [Pa]
 
     dL = L/N_ELE
-    
-    T = np.empty(N_ELE)
-    T[0] = T_in
-    E = 0
+    h = Nu * k / D # heat transfer coefficient
+    hA = 2 * h * (W+H) * dL # element conductance [W/K]
+    mcp = rho * Q_SI * cp # fluid heat capacity rate [W/K]
 
-    for i in range(1, N_ELE):
+    if method == 'closed':
+        if mu_B or dcp_dT or dk_dT:
+            raise ValueError("Invalid method, temperature-dependent properties need method='march'")
 
-        T_in_ = T[i-1] # element inlet temperature [K]
-                
-        h = Nu * k / D # heat transfer coefficient
-        dE = 2 * h * (W+H)* dL * (T_w - T_in_) # heat transfer [W]
-        T_out = (dE / (rho * Q_SI * cp)) + T_in_ # element outlet temperature [K]
+        # h, W, H, dL and T_w are constant along the channel, so every element
+        # applies the same linear update (T_w - T[i]) = (1 - hA/mcp) * (T_w - T[i-1]),
+        # which gives T[i] = T_w - (1 - hA/mcp)**i * (T_w - T_in) and
+        # E = mcp * (T[-1] - T_in) exactly (up to round-off) for the discrete march
+        decay = 1 - hA / mcp
+        if isinstance(decay, float):
+            decay = np.float64(decay) # overflow to inf like the march, instead of raising
 
-        T[i] = T_out
-        E += dE
+        if make_fields:
+            T = T_w - (T_w - T_in) * decay**np.arange(N_ELE)
+            return np.linspace(0, L, N_ELE), T
+
+        T_out = T_w - (T_w - T_in) * decay**(N_ELE-1)
+        E = mcp * (T_out - T_in)
+
+    elif method == 'march':
+        T, E, mu_ratio = get_march(backend)(T_in, T_w, N_ELE, mcp / cp, rho * v * D, D, P * dL,
+                                            mu, cp, k, T_boiling_point, latent_heat_of_vaporization,
+                                            T_ref, mu_B, dcp_dT, dk_dT)
+        dP = dP * mu_ratio # laminar pressure loss scales with the viscosity
+
+        if make_fields:
+            return np.linspace(0, L, N_ELE), T
+
+        T_out = T[N_ELE-1]
+
+    else:
+        raise ValueError("Invalid method, must be 'closed' or 'march'")
 
     q = E / ( 4 * W * L * 10000 )
     
-    if make_fields:
-        return np.linspace(0, L, N_ELE), T
-    
-    return q, dP, T[N_ELE-1]
+    return q, dP, T_out
+
+def naive_model_adaptive(T_in, T_w, Q,
+                         L, W, H,
+                         rho, mu, cp, k, T_boiling_point,
+                         latent_heat_of_vaporization,
+                         tol=1e-6, N_min=16, N_max=2**20, **kwargs):
+    # Evaluate naive_model with an element count chosen for the requested
+    # accuracy. Starts from N_min elements and doubles the count until the
+    # relative change in q and in the outlet temperature rise (T_out - T_in)
+    # is below tol, or N_max is reached.
+    #
+    # tol : relative tolerance on q and T_out - T_in
+    # N_min : initial element count
+    # N_max : largest element count to try
+    # other arguments and kwargs (method, backend) are passed to naive_model
+    #
+    # Returns
+    # q : the heat flux [W/cm2]
+    # dP : the backpressure [Pascal]
+    # T_out : the fluid temperature at the outlet [K]
+    # N_ELE : the element count used
+
+    N_ELE = N_min
+    q, dP, T_out = naive_model(T_in, T_w, Q, L, W, H, rho, mu, cp, k,
+                               T_boiling_point, latent_heat_of_vaporization,
+                               N_ELE=N_ELE, **kwargs)
+
+    while N_ELE < N_max:
+        N_ELE *= 2
+        q_next, dP, T_out_next = naive_model(T_in, T_w, Q, L, W, H, rho, mu, cp, k,
+                                             T_boiling_point, latent_heat_of_vaporization,
+                                             N_ELE=N_ELE, **kwargs)
+
+        # NaN / inf from an unstable coarse march never counts as converged
+        converged = np.all(np.isfinite(q_next)) and np.all(np.isfinite(T_out_next)) \
+            and np.all(np.abs(q_next - q) <= tol * np.abs(q_next)) \
+            and np.all(np.abs(T_out_next - T_out) <= tol * np.abs(T_out_next - T_in))
+
+        q, T_out = q_next, T_out_next
+        if converged:
+            return q, dP, T_out, N_ELE
+
+    print('Warning: naive_model did not converge to tol =', tol, 'within N_ELE =', N_ELE, 'elements')
+    return q, dP, T_out, N_ELE
+
+def naive_model_batch(T_in, T_w, Q,
+                      L, W, H,
+                      rho, mu, cp, k, T_boiling_point,
+                      latent_heat_of_vaporization,
+                      N_ELE=1000, **kwargs):
+    # Evaluate naive_model for many cases at once. Any of the inputs may be
+    # a scalar or a NumPy array; they are broadcast together and solved in a
+    # single vectorized call of the closed-form method, without building a
+    # Geometry / MicroChannelCooler per case.
+    #
+    # Arguments are the same as naive_model
+    #
+    # Returns
+    # q : the heat flux [W/cm2], array of the broadcast shape
+    # dP : the backpressure [Pascal], array of the broadcast shape
+    # T_out : the fluid temperature at the outlet [K], array of the broadcast shape
+
+    args = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in
+                                 (T_in, T_w, Q, L, W, H, rho, mu, cp, k,
+                                  T_boiling_point, latent_heat_of_vaporization)))
+
+    return naive_model(*args, make_fields=False, N_ELE=N_ELE, method='closed')
+
+def naive_model_grad(T_in, T_w, Q,
+                     L, W, H,
+                     rho, mu, cp, k, T_boiling_point,
+                     latent_heat_of_vaporization,
+                     N_ELE=1000, **kwargs):
+    # Evaluate the closed-form naive_model together with its analytic
+    # derivatives with respect to L, W, H and Q. Inputs may be scalars or
+    # NumPy arrays and are broadcast together (see naive_model_batch).
+    #
+    # Arguments are the same as naive_model
+    #
+    # Returns
+    # q : the heat flux [W/cm2]
+    # dP : the backpressure [Pascal]
+    # T_out : the fluid temperature at the outlet [K]
+    # jac : dict of output name ('q', 'dP', 'T_out') -> dict of
+    #       variable name ('L', 'W', 'H', 'Q') -> derivative
+
+    T_in, T_w, Q, L, W, H, rho, mu, cp, k, T_boiling_point, latent_heat_of_vaporization = \
+        np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in
+                              (T_in, T_w, Q, L, W, H, rho, mu, cp, k,
+                               T_boiling_point, latent_heat_of_vaporization)))
+
+    q, dP, T_out = naive_model(T_in, T_w, Q, L, W, H, rho, mu, cp, k,
+                               T_boiling_point, latent_heat_of_vaporization,
+                               N_ELE=N_ELE, method='closed')
+
+    # the model reduces to
+    #   Re = 2 rho Q_SI / (mu (W+H))
+    #   dP = 16 mu Q_SI L (W+H) / (W^2 H^3)
+    #   a = hA/mcp = Nu k (W+H)^2 L / (W H N_ELE rho Q_SI cp)
+    #   T_out = T_w - (T_w - T_in) (1 - a)^(N_ELE-1)
+    #   q = rho Q_SI cp (T_out - T_in) / (4 W L 10000)
+    # so the derivatives follow from the logarithmic derivatives of Re and a
+    Q_SI = Q * 1e-9 / 60 # flow rate [m^3/s]
+    Re = 2 * rho * Q_SI / (mu * (W + H)) # Reynolds number
+    Pr = cp * mu / k # Prandtl number
+    fT = (1 + cp * (T_w - T_boiling_point) / latent_heat_of_vaporization)**(-2/3) # Zhuifu model (2013)
+    Nu = (2 + 0.552 * Re**0.5 * Pr**(1/3)) * fT # Nusselt number
+    s = (Nu - 2 * fT) / (2 * Nu) # d ln(Nu) / d ln(Re)
+    a = Nu * k * (W + H)**2 * L / (W * H * N_ELE * rho * Q_SI * cp)
+
+    dlnRe = {'L': 0.0, 'W': -1 / (W + H), 'H': -1 / (W + H), 'Q': 1 / Q}
+    dlnA = {'L': 1 / L, 'W': 2 / (W + H) - 1 / W, 'H': 2 / (W + H) - 1 / H, 'Q': -1 / Q}
+    dlndP = {'L': 1 / L, 'W': 1 / (W + H) - 2 / W, 'H': 1 / (W + H) - 3 / H, 'Q': 1 / Q}
+    dlnq = {'L': -1 / L, 'W': -1 / W, 'H': 0.0, 'Q': 1 / Q} # of the rho Q_SI cp / (4 W L) factor
+
+    dT_out_da = (T_w - T_in) * (N_ELE - 1) * (1 - a)**(N_ELE - 2)
+    q_per_dT = rho * Q_SI * cp / (4 * W * L * 10000)
+
+    jac = {'q': {}, 'dP': {}, 'T_out': {}}
+    for var in ('L', 'W', 'H', 'Q'):
+        da = a * (s * dlnRe[var] + dlnA[var])
+        jac['T_out'][var] = dT_out_da * da
+        jac['dP'][var] = dP * dlndP[var]
+        jac['q'][var] = q * dlnq[var] + q_per_dT * jac['T_out'][var]
+
+    return q, dP, T_out, jac
+
+def _cache_key(x):
+    # Exact, hashable key of a scalar or array input, or None if x has none
+    # (e.g. a torch tensor). Scalars become floats (so 100 and 100.0 hit the
+    # same entry), arrays become their float64 (shape, bytes).
+    if isinstance(x, numbers.Real):
+        return float(x)
+    if isinstance(x, (np.ndarray, list, tuple)):
+        try:
+            a = np.asarray(x, dtype=np.float64)
+        except (TypeError, ValueError):
+            return None
+        return float(a) if a.ndim == 0 else (a.shape, a.tobytes())
+    return None
+
+def _from_cache_key(key):
+    if isinstance(key, tuple):
+        shape, data = key
+        return np.frombuffer(data, dtype=np.float64).reshape(shape)
+    return key
+
+@functools.lru_cache(maxsize=int(os.environ.get('NAIVE_MODEL_CACHE_SIZE', 4096)))
+def _naive_model_lru(*key):
+    # functools.lru_cache is bounded, evicts least recently used entries,
+    # counts hits / misses and is safe to call from Flask worker threads
+    *args, N_ELE, method, backend, T_ref, mu_B, dcp_dT, dk_dT = key
+    args = [_from_cache_key(x) for x in args]
+    if any(isinstance(x, np.ndarray) for x in args):
+        args = np.broadcast_arrays(*args)
+    return naive_model(*args, make_fields=False, N_ELE=N_ELE, method=method, backend=backend,
+                       T_ref=T_ref, mu_B=mu_B, dcp_dT=dcp_dT, dk_dT=dk_dT)
+
+def naive_model_cached(T_in, T_w, Q,
+                       L, W, H,
+                       rho, mu, cp, k, T_boiling_point,
+                       latent_heat_of_vaporization,
+                       N_ELE=1000, method='closed', backend=None,
+                       T_ref=298.15, mu_B=0.0, dcp_dT=0.0, dk_dT=0.0, **kwargs):
+    # Memoized naive_model. Scalar and array inputs are canonicalized (see
+    # _cache_key) and looked up in an in-process LRU cache of
+    # NAIVE_MODEL_CACHE_SIZE entries; arrays are broadcast together as in
+    # naive_model_batch. Inputs that cannot be canonicalized (torch tensors)
+    # are passed straight to naive_model.
+    #
+    # Arguments and returns are the same as naive_model (without make_fields)
+
+    args = (T_in, T_w, Q, L, W, H, rho, mu, cp, k,
+            T_boiling_point, latent_heat_of_vaporization)
+
+    properties = (float(T_ref), float(mu_B), float(dcp_dT), float(dk_dT))
+
+    key = tuple(_cache_key(x) for x in args)
+    if any(x is None for x in key):
+        return naive_model(*args, N_ELE=N_ELE, method=method, backend=backend,
+                           T_ref=T_ref, mu_B=mu_B, dcp_dT=dcp_dT, dk_dT=dk_dT)
+
+    # copies, so a caller cannot modify the cached arrays
+    return tuple(np.array(x) if isinstance(x, np.ndarray) else x
+                 for x in _naive_model_lru(*key, int(N_ELE), method, backend, *properties))
+
+def naive_model_cache_info():
+    # Returns the (hits, misses, maxsize, currsize) of the naive_model cache
+    return _naive_model_lru.cache_info()
+
+def naive_model_cache_clear():
+    _naive_model_lru.cache_clear()
 
 class Geometry:
     def __init__(self, L, W, H):
@@ -112,21 +417,56 @@ class MicroChannelCooler:
         self.T_w = T_w
         self.Q = Q
         
-    def solve(self, make_fields=False):
+    def solve(self, make_fields=False, method='closed', backend=None, cache=True):
         # Returns the heat flux, pressure drop, and output temperature
         # using the naive method
         #
+        # method : 'closed' (default) or 'march', see naive_model
+        # backend : 'python' or 'numba' kernel for the 'march' method
+        # cache : look up / store the result in the naive_model_cached LRU cache
+        #
         # Returns
         # q : the heat transfer [W/cm^3]
         # dP : the pressure loss [Pa]
         # T_out : the outlet temperature [K]
-        
+
+        if cache and not make_fields:
+            return naive_model_cached(self.T_in,
+                                      self.T_w,
+                                      self.Q,
+                                      **self.geometry.__dict__,
+                                      **self.fluid.__dict__,
+                                      method=method,
+                                      backend=backend)
+
         return naive_model(self.T_in,
                             self.T_w,
                             self.Q,
                             **self.geometry.__dict__,
                             **self.fluid.__dict__,
-                            make_fields=make_fields)
+                            make_fields=make_fields,
+                            method=method,
+                            backend=backend)
+
+    def solve_adaptive(self, tol=1e-6, method='closed', backend=None):
+        # Returns the heat flux, pressure drop, and output temperature
+        # using the naive method, refining the element count until the
+        # result changes by less than tol (see naive_model_adaptive)
+        #
+        # Returns
+        # q : the heat transfer [W/cm^3]
+        # dP : the pressure loss [Pa]
+        # T_out : the outlet temperature [K]
+        # N_ELE : the element count used
+
+        return naive_model_adaptive(self.T_in,
+                                    self.T_w,
+                                    self.Q,
+                                    **self.geometry.__dict__,
+                                    **self.fluid.__dict__,
+                                    tol=tol,
+                                    method=method,
+                                    backend=backend)
 
 
 def main():
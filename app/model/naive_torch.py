@@ -0,0 +1,78 @@
+#!/bin/python3
+
+import torch
+
+
+def naive_model_torch(T_in, T_w, Q,
+                      L, W, H,
+                      rho, mu, cp, k, T_boiling_point,
+                      latent_heat_of_vaporization,
+                      make_fields=False, N_ELE=1000, **kwargs):
+    """
+    Batched PyTorch implementation of model.naive_model.naive_model.
+
+    Uses the closed form of the element march, so the whole model is a single
+    autograd graph of elementwise tensor ops. Any input may be a Python number
+    or a tensor of any shape; inputs are broadcast together, so a leading batch
+    dimension evaluates (and differentiates) many designs in one call.
+
+    Parameters:
+        Same as model.naive_model.naive_model. Tensors set the dtype and
+        device of the result; Python numbers are converted to match.
+
+    Returns:
+        q (tensor): the heat flux [W/cm2]
+        dP (tensor): the backpressure [Pascal]
+        T_out (tensor): the fluid temperature at the outlet [K]
+
+        or, if make_fields is True, the element positions [m] and
+        temperatures [K] along a trailing dimension of size N_ELE.
+    """
+
+    args = (T_in, T_w, Q, L, W, H, rho, mu, cp, k, T_boiling_point, latent_heat_of_vaporization)
+    ref = next((x for x in args if torch.is_tensor(x)), None)
+    dtype = ref.dtype if ref is not None else torch.float64
+    device = ref.device if ref is not None else None
+    (T_in, T_w, Q, L, W, H, rho, mu, cp, k, T_boiling_point,
+     latent_heat_of_vaporization) = (torch.as_tensor(x, dtype=dtype, device=device) for x in args)
+
+    A = W * H # cross-sectional area [m^2]
+    P = 2 * (W + H) # perimeter [m]
+    D = 4 * A / P # hydraulic diameter [m]
+
+    Q_SI = Q * 1e-9 / 60 # flow rate [m^3/s]
+
+    v = Q_SI / A # fluid velocity [m/s]
+
+    Re = rho * v * D / mu # Reynolds number
+    Pr = cp * mu / k # Prandtl number
+
+    Nu_uncor = 2 + 0.552 * Re**0.5 * Pr**(1/3) # Nusselt number, uncorrected (Zhuifu, 2013)
+
+    BTp = cp * (T_w - T_boiling_point) / latent_heat_of_vaporization # Spalding number
+    fT = (1 + BTp)**(-2/3) # Zhuifu model (2013)
+    Nu = Nu_uncor*fT # Nusselt number, correction for Zhuifu model (2013)
+
+    f = 64/Re
+    dP = ( f * L * rho * (v**2) ) / ( 2 * H ) # pressure loss [Pa]
+
+    dL = L/N_ELE
+    h = Nu * k / D # heat transfer coefficient
+    hA = 2 * h * (W+H) * dL # element conductance [W/K]
+    mcp = rho * Q_SI * cp # fluid heat capacity rate [W/K]
+
+    # closed form of the element march, see naive_model
+    decay = 1 - hA / mcp
+
+    if make_fields:
+        n = torch.arange(N_ELE, dtype=dtype, device=device)
+        T = T_w.unsqueeze(-1) - (T_w - T_in).unsqueeze(-1) * decay.unsqueeze(-1)**n
+        x = L.unsqueeze(-1) * torch.linspace(0, 1, N_ELE, dtype=dtype, device=device)
+        return x, T
+
+    T_out = T_w - (T_w - T_in) * decay**(N_ELE-1)
+    E = mcp * (T_out - T_in)
+
+    q = E / ( 4 * W * L * 10000 )
+
+    return q, dP, T_out
@@ -0,0 +1,111 @@
+#!/bin/python3
+
+import math
+import multiprocessing as mp
+import numpy as np
+from scipy.stats import qmc
+from model.fluids import water
+from model.limits import get_bounds
+from model.naive_model import naive_model_batch
+
+design_variables = ['L', 'W', 'H', 'Q']
+fluid_properties = ['rho', 'mu', 'cp', 'k', 'T_boiling_point', 'latent_heat_of_vaporization']
+
+def non_dominated(q, dP):
+    # Indices of the points not dominated in (maximize q, minimize dP),
+    # sorted by increasing dP
+    order = np.lexsort((-q, dP)) # by dP, then by decreasing q
+    q_sorted = q[order]
+    best = np.maximum.accumulate(q_sorted)
+    keep = np.empty(len(order), dtype=bool)
+    keep[:1] = True
+    keep[1:] = q_sorted[1:] > best[:-1] # must beat every point with lower dP
+    return order[keep]
+
+def _evaluate_batch(task):
+    # Sample, solve and reduce one batch of candidates (runs in a worker process)
+    start, n, seed, variables, bounds, fixed, T_out_min, T_out_max, N_ELE = task
+
+    sampler = qmc.Sobol(len(variables), scramble=True, seed=seed)
+    if start > 0:
+        sampler.fast_forward(start)
+    u = sampler.random(n)
+
+    # log-uniform between the bounds, since they span several decades
+    lo, hi = np.log(bounds[:, 0]), np.log(bounds[:, 1])
+    x = np.exp(lo + u * (hi - lo))
+    inputs = {**fixed, **{var: x[:, d] for d, var in enumerate(variables)}}
+
+    # the march of over-range samples overflows, those are dropped below on purpose
+    with np.errstate(over='ignore', invalid='ignore'):
+        q, dP, T_out = naive_model_batch(**inputs, N_ELE=N_ELE)
+
+        # drop designs where the element march is unstable for this N_ELE, which
+        # shows up as an outlet temperature outside [T_in, T_w]
+        T_in, T_w = inputs['T_in'], inputs['T_w']
+        feasible = np.isfinite(q) & np.isfinite(dP) & ((T_out - T_in) * (T_w - T_out) >= 0)
+    if T_out_min is not None:
+        feasible &= T_out >= T_out_min
+    if T_out_max is not None:
+        feasible &= T_out <= T_out_max
+
+    idx = np.flatnonzero(feasible)
+    idx = idx[non_dominated(q[idx], dP[idx])]
+    return x[idx], q[idx], dP[idx], T_out[idx]
+
+def pareto_front(T_in, T_w, fluid=water, variables=design_variables, n_samples=2**20, batch=2**16,
+                 T_out_min=None, T_out_max=None, processes=None, seed=None, N_ELE=1000, **fixed):
+    """
+    Non-dominated front of heat flux q (maximized) against pressure drop dP (minimized).
+
+    Candidate designs are Sobol-sampled (log-uniform) inside limits for the chosen
+    variables, solved in vectorized batches with naive_model_batch, and the batches
+    are spread across a process pool. Each worker returns only its own front, which
+    are merged into the final one.
+
+    Parameters:
+        T_in (float): Fluid inlet temperature [K]
+        T_w (float): Fluid wall temperature [K]
+        fluid (Fluid): the coolant
+        variables (array): design variables to sweep, a subset of 'L', 'W', 'H', 'Q'
+        n_samples (int): number of candidate designs (rounded up to whole batches)
+        batch (int): candidates per vectorized batch, a power of 2
+        T_out_min, T_out_max (float): optional outlet temperature constraints [K]
+        processes (int): worker processes, None for one per CPU, 1 to run in-process
+        seed (int): Sobol scrambling seed
+        N_ELE (int): element count of the naive model
+        fixed: values for the design variables that are not swept (L, W, H [m], Q [uL/min])
+
+    Returns:
+        front (dict): arrays of the variables, 'q', 'dP' and 'T_out' of the front, by increasing dP
+    """
+    variables = [var for var in design_variables if var in variables]
+    missing = [var for var in design_variables if var not in variables and var not in fixed]
+    if missing:
+        raise ValueError(f"Values must be given for the fixed variables {missing}")
+
+    bounds = np.array([get_bounds(var) for var in variables], dtype=np.float64).reshape(-1, 2)
+    fixed = {'T_in': T_in, 'T_w': T_w,
+             **{name: getattr(fluid, name) for name in fluid_properties},
+             **{var: fixed[var] for var in design_variables if var not in variables}}
+
+    # every task draws its own slice of the same scrambled Sobol sequence
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    n_batches = math.ceil(n_samples / batch)
+    tasks = [(b * batch, batch, seed, variables, bounds, fixed, T_out_min, T_out_max, N_ELE)
+             for b in range(n_batches)]
+
+    if processes == 1 or n_batches == 1:
+        results = [_evaluate_batch(task) for task in tasks]
+    else:
+        with mp.Pool(processes) as pool:
+            results = pool.map(_evaluate_batch, tasks)
+
+    x = np.concatenate([r[0] for r in results])
+    q, dP, T_out = (np.concatenate([r[i] for r in results]) for i in (1, 2, 3))
+    idx = non_dominated(q, dP)
+
+    front = {var: x[idx, d] for d, var in enumerate(variables)}
+    front.update(q=q[idx], dP=dP[idx], T_out=T_out[idx])
+    return front
@@ -1,22 +1,34 @@
 #!/bin/python3
 
 import contextlib
+import sys
 import numpy as np
 import math
-import torch
 
-from torch.autograd import Variable
-from model.naive_model import Geometry, MicroChannelCooler, naive_model
-from model.limits import clamp_variables
+from scipy.optimize import minimize
+from model.naive_model import Geometry, MicroChannelCooler, naive_model_grad
+from model.limits import clamp_variables, get_bounds
+from model.jobs import job_manager
+from model.checkpoint import save_checkpoint, load_checkpoint, clear_checkpoint
 
+# torch is only imported by the autograd and Adam code paths, so the analytic
+# gradient and L-BFGS-B paths run without it
 
-def cancel_opt(inst):
-    del inst
+
+def cancel_opt(job_id):
+    # Cancel an optimization job submitted to model.jobs.job_manager; the job
+    # stops at its next progress report, i.e. between two iterations
+    cancelled = job_manager.cancel(job_id)
     with contextlib.suppress(Exception):
+        import torch
         torch.cuda.empty_cache()
+    return cancelled
     
 
 def make_variables(in_vars,opt_names):
+    import torch
+    from torch.autograd import Variable
+
     dev = "cuda:0" if torch.cuda.is_available() else "cpu"
     device = torch.device(dev)
 
@@ -35,7 +47,46 @@ def output(var_dict, loss, err):
     # Step 6: Return results
     return [var_dict.values(), loss, err]
 
-def sgd_model(parameter_choice, optimize_type, progress, learning_rate, num_iterations, **default):
+def objective_value(optimize_type, q, dP, T_out, T_in):
+    # Objective to minimize, works for tensors and arrays
+    if optimize_type == 'default':
+        return dP - q
+    elif optimize_type == 'q':
+        return -q     # Email Tejawsi about manufacturing constraints s.t. we'll have ranges to clamp on.
+    elif optimize_type == 'dP':
+        return dP
+    elif optimize_type == 'T_out':
+        return (T_out - T_in) ** 2
+    else:
+        raise ValueError("Invalid optimize_type, must be 'q', 'dP', or 'T_out'")
+
+def objective_grad(optimize_type, q, dP, T_out, T_in, jac):
+    # Derivatives of objective_value from the naive_model_grad Jacobian
+    if optimize_type == 'default':
+        return {var: jac['dP'][var] - jac['q'][var] for var in jac['q']}
+    elif optimize_type == 'q':
+        return {var: -jac['q'][var] for var in jac['q']}
+    elif optimize_type == 'dP':
+        return dict(jac['dP'])
+    elif optimize_type == 'T_out':
+        return {var: 2 * (T_out - T_in) * jac['T_out'][var] for var in jac['T_out']}
+    else:
+        raise ValueError("Invalid optimize_type, must be 'q', 'dP', or 'T_out'")
+
+def rng_state():
+    # RNG state stored with every checkpoint, torch's only when torch is in use
+    state = {'numpy': np.random.get_state()}
+    if 'torch' in sys.modules:
+        state['torch'] = sys.modules['torch'].get_rng_state()
+    return state
+
+def set_rng_state(state):
+    if 'torch' in state and 'torch' in sys.modules:
+        sys.modules['torch'].set_rng_state(state['torch'])
+    np.random.set_state(state['numpy'])
+
+def sgd_model(parameter_choice, optimize_type, progress, learning_rate, num_iterations, gradient='autograd',
+              checkpoint=None, resume=None, checkpoint_every=100, **default):
     """
     Optimization using stochastic gradient-based optimization with PyTorch.
 
@@ -49,11 +100,18 @@ def sgd_model(parameter_choice, optimize_type, progress, learning_rate, num_iter
         Q (float): Fluid flow rate [uL/min]
         optimize_type (string): Pick a parameter to optimize: 'default', 'q', 'dP', 'T_out'
         parameter_choice (array): Given user parameters to optimize for. If parameters are picked, they will not be kept constant, allowing those parameters to be optimized.
+        gradient (string): 'autograd' to differentiate through the torch model, or 'analytic' to use naive_model_grad (no autograd graph is built)
+        checkpoint (string): key (e.g. a job id) to save the optimizer state under,
+            see model.checkpoint; defaults to resume
+        resume (string): key of a checkpoint to continue from
+        checkpoint_every (int): iterations between checkpoints
         
 
     Returns:
         Optimized parameters (subset in order of opt_names)
     """
+    import torch
+    from model.naive_torch import naive_model_torch
     
     # Step 1: Create PyTorch Variables for the input parameters
     opt_names = ["L", "W", "H"]
@@ -65,38 +123,77 @@ def sgd_model(parameter_choice, optimize_type, progress, learning_rate, num_iter
     
     # Initialize the loss array (for plotting/debugging)
     loss = np.zeros(num_iterations)
+    start = 0
+
+    # Continue from a checkpoint
+    key = checkpoint if checkpoint is not None else resume
+    state = load_checkpoint(resume) if resume is not None else None
+    if state is not None:
+        if state['parameter_choice'] != list(parameter_choice) or state['optimize_type'] != optimize_type:
+            raise ValueError(f"Checkpoint {resume} does not match parameter_choice / optimize_type")
+        with torch.no_grad():
+            for name, var in var_dict.items():
+                var.copy_(torch.as_tensor(state['params'][name]))
+        optimizer.load_state_dict(state['optimizer'])
+        start = min(state['iteration'], num_iterations)
+        loss[:start] = state['loss'][:start]
+        set_rng_state(state['rng'])
+
+    def save(iteration):
+        save_checkpoint(key, {
+            'iteration': iteration,
+            'parameter_choice': list(parameter_choice),
+            'optimize_type': optimize_type,
+            'params': {name: var.detach().cpu() for name, var in var_dict.items()},
+            'optimizer': optimizer.state_dict(),
+            'loss': loss[:iteration].copy(),
+            'rng': rng_state(),
+        })
+
+    def finish(err):
+        # a finished run has nothing left to resume
+        if key is not None:
+            clear_checkpoint(key)
+        return output(var_dict, loss, err)
 
     # Step 4: Optimization loop
-    for i in range(num_iterations):
+    for i in range(start, num_iterations):
         # Clear the gradients from the previous iteration
         optimizer.zero_grad(set_to_none=True)           
 
-        # Solve using Naive method
-        default.update(var_dict)
-        q_torch,dP_torch, T_out = naive_model(**default)
-
-        # Compute the objective function
-        if optimize_type == 'default':
-            objective = dP_torch - q_torch
-        elif optimize_type == 'q':
-            objective = -q_torch     # Email Tejawsi about manufacturing constraints s.t. we'll have ranges to clamp on.
-        elif optimize_type == 'dP':
-            objective = dP_torch
-        elif optimize_type == 'T_out':
-            objective = (T_out - T_in) ** 2
-        else:
-            raise ValueError("Invalid optimize_type, must be 'q', 'dP', or 'T_out'")
+        if gradient == 'autograd':
+            # Solve using Naive method
+            default.update(var_dict)
+            q_torch,dP_torch, T_out = naive_model_torch(**default)
 
-        # objective += torch.zeros_like(objective, device=objective.device, requires_grad=True) # workaround to prevent loss of gradient function due to detach in clamp_variables
-        # otherwise when all variables are optimized, the gradient function is lost and the optimizer will not work
-        
-        # Save the loss / objective value for debugging/plotting
-        loss[i] = objective.item()
-        if not math.isfinite(loss[i]):
-            return output(var_dict, loss, "Objective / Loss has diverged.")
+            # Compute the objective function
+            objective = objective_value(optimize_type, q_torch, dP_torch, T_out, default['T_in'])
+
+            # Save the loss / objective value for debugging/plotting
+            loss[i] = objective.item()
+            if not math.isfinite(loss[i]):
+                return finish("Objective / Loss has diverged.")
 
-        # Compute the gradients
-        objective.backward()
+            # Compute the gradients
+            objective.backward()
+
+        elif gradient == 'analytic':
+            # Solve using Naive method, with closed-form derivatives
+            values = {name: var.detach().cpu().numpy().astype(np.float64) for name, var in var_dict.items()}
+            q, dP, T_out, jac = naive_model_grad(**{**default, **values})
+
+            objective = objective_value(optimize_type, q, dP, T_out, default['T_in'])
+            loss[i] = float(objective)
+            if not math.isfinite(loss[i]):
+                return finish("Objective / Loss has diverged.")
+
+            # Set the gradients
+            grad = objective_grad(optimize_type, q, dP, T_out, default['T_in'], jac)
+            for name, var in var_dict.items():
+                var.grad = torch.as_tensor(grad[name], dtype=var.dtype, device=var.device)
+
+        else:
+            raise ValueError("Invalid gradient, must be 'autograd' or 'analytic'")
 
         # Update the parameters
         optimizer.step()
@@ -104,27 +201,430 @@ def sgd_model(parameter_choice, optimize_type, progress, learning_rate, num_iter
         # Clamp L
         clamp_variables(var_dict, old_var_dict, parameter_choice)
 
+        if key is not None and (i + 1) % checkpoint_every == 0:
+            save(i + 1)
+
         # update progress bar
         if progress:
-            progress(
-                [
-                    str(i),
-                    str(num_iterations),
-                ]
-            )
+            try:
+                progress(
+                    [
+                        str(i),
+                        str(num_iterations),
+                    ]
+                )
+            except Exception: # e.g. a cancelled job, keep its progress for a resume
+                if key is not None:
+                    save(i + 1)
+                raise
+
+    return finish(None)
+
+
+def sobol_starts(parameter_choice, n_starts, seed=None):
+    """
+    Sobol-sampled starting values inside limits.
+
+    Parameters:
+        parameter_choice (array): variables to sample
+        n_starts (int): number of starting designs
+        seed (int): scrambling seed, for reproducible starts
+
+    Returns:
+        dict of variable name -> array of n_starts starting values [SI units]
+    """
+    import torch
+
+    engine = torch.quasirandom.SobolEngine(dimension=len(parameter_choice), scramble=True, seed=seed)
+    u = engine.draw(n_starts, dtype=torch.float64).numpy()
+    starts = {}
+    for d, var in enumerate(parameter_choice):
+        minl, maxl = get_bounds(var)
+        starts[var] = minl + u[:, d] * (maxl - minl)
+    return starts
+
+def feasible_march(T_out, T_in, T_w):
+    # Designs whose element march is stable, i.e. T_out in [T_in, T_w] (as in pareto_model)
+    return np.isfinite(T_out) & ((T_out - T_in) * (T_w - T_out) >= 0)
+
+def sgd_multistart(parameter_choice, optimize_type, progress, learning_rate, num_iterations, n_starts=16, gradient='autograd', seed=None,
+                   checkpoint=None, resume=None, checkpoint_every=100, **default):
+    """
+    Multi-start version of sgd_model.
+
+    Optimizes n_starts Sobol-sampled starting designs (see sobol_starts) at once as a
+    single batched tensor problem, so all starts share one model evaluation and one
+    backward pass per iteration. As in optimize_model, the steps are taken in
+    coordinates normalized to the limits (0 at 'min', 1 at 'max'), which are clamped
+    to the unit box after every step. A start whose step leaves the stable march
+    (T_out outside [T_in, T_w]) or diverges goes back to its previous design and stops.
 
-    return output(var_dict, loss, None)
+    Parameters:
+        Same as sgd_model (learning_rate is in normalized coordinates), and
+        n_starts (int): number of starting designs
+        seed (int): Sobol scrambling seed
+        checkpoint (string): key (e.g. a job id) to save the optimizer state under,
+            see model.checkpoint; defaults to resume
+        resume (string): key of a checkpoint to continue from
+        checkpoint_every (int): iterations between checkpoints
+
+    Returns:
+        ranked (list): one dict per distinct optimized design with its L, W, H and
+            final 'objective', sorted from best to worst (infeasible starts are dropped,
+            starts that end on the same design are merged)
+        loss (array): objective per iteration and start, shape (num_iterations, n_starts)
+        err: None, or an error message if no start ended on a feasible design
+    """
+    import torch
+    from model.naive_torch import naive_model_torch
+
+    opt_names = ["L", "W", "H"]
+    parameter_choice = [var for var in opt_names if var in parameter_choice]
+    starts = sobol_starts(parameter_choice, n_starts, seed)
+    bounds = {var: get_bounds(var) for var in parameter_choice}
+
+    dev = "cuda:0" if torch.cuda.is_available() else "cpu"
+    device = torch.device(dev)
+
+    # one batched tensor per variable: the normalized coordinates u of the chosen ones,
+    # the fixed values of the others
+    u_dict = {}
+    for name in parameter_choice:
+        lo, hi = bounds[name]
+        u_dict[name] = torch.tensor((starts[name] - lo) / (hi - lo), dtype=torch.float64, device=device, requires_grad=True)
+    fixed = {name: torch.full((n_starts,), float(default[name]), dtype=torch.float64, device=device)
+             for name in opt_names if name not in parameter_choice}
+    params = list(u_dict.values())
+    optimizer = torch.optim.SGD(params, lr=learning_rate)
+
+    def designs():
+        # SI values of the current designs, in the autograd graph of u
+        x = dict(fixed)
+        for name, u in u_dict.items():
+            lo, hi = bounds[name]
+            x[name] = lo + u * (hi - lo)
+        return x
+
+    loss = np.zeros((num_iterations, n_starts))
+    active = np.ones(n_starts, dtype=bool) # starts still being optimized
+    start = 0
+
+    key = checkpoint if checkpoint is not None else resume
+    state = load_checkpoint(resume) if resume is not None else None
+    if state is not None:
+        if state['parameter_choice'] != parameter_choice or state['n_starts'] != n_starts:
+            raise ValueError(f"Checkpoint {resume} does not match parameter_choice / n_starts")
+        with torch.no_grad():
+            for name in parameter_choice:
+                u_dict[name].copy_(torch.as_tensor(state['params'][name]))
+        optimizer.load_state_dict(state['optimizer'])
+        start = min(state['iteration'], num_iterations)
+        loss[:start] = state['loss'][:start]
+        active = state['active']
+        set_rng_state(state['rng'])
+
+    def save(iteration):
+        save_checkpoint(key, {
+            'iteration': iteration,
+            'parameter_choice': parameter_choice,
+            'n_starts': n_starts,
+            'params': {name: u.detach().cpu() for name, u in u_dict.items()},
+            'optimizer': optimizer.state_dict(),
+            'loss': loss[:iteration].copy(),
+            'active': active.copy(),
+            'rng': rng_state(),
+        })
+
+    u_last = {name: u.detach().clone() for name, u in u_dict.items()} # last feasible iterate
+    for i in range(start, num_iterations):
+        optimizer.zero_grad(set_to_none=True)
+
+        if gradient == 'autograd':
+            q_torch, dP_torch, T_out = naive_model_torch(**{**default, **designs()})
+            objective = objective_value(optimize_type, q_torch, dP_torch, T_out, default['T_in'])
+            loss[i] = objective.detach().cpu().numpy()
+            T_out = T_out.detach().cpu().numpy()
+
+            # designs are independent, so the gradient of the sum is the
+            # gradient of each design's objective
+            objective.sum().backward()
+
+        elif gradient == 'analytic':
+            values = {name: x.detach().cpu().numpy() for name, x in designs().items()}
+            q, dP, T_out, jac = naive_model_grad(**{**default, **values})
+            loss[i] = objective_value(optimize_type, q, dP, T_out, default['T_in'])
+
+            grad = objective_grad(optimize_type, q, dP, T_out, default['T_in'], jac)
+            for name, u in u_dict.items():
+                lo, hi = bounds[name]
+                u.grad = torch.as_tensor(grad[name] * (hi - lo), dtype=u.dtype, device=u.device)
+
+        else:
+            raise ValueError("Invalid gradient, must be 'autograd' or 'analytic'")
+
+        # a start that diverged or left the stable march goes back to its last
+        # feasible design and is frozen there, instead of aborting the whole batch
+        good = np.isfinite(loss[i]) & feasible_march(T_out, default['T_in'], default['T_w'])
+        stopped = torch.as_tensor(active & ~good, device=device)
+        active &= good
+        mask = torch.as_tensor(active, device=device)
+        with torch.no_grad():
+            for name, u in u_dict.items():
+                u.copy_(torch.where(stopped, u_last[name], u))
+                if u.grad is not None:
+                    u.grad = torch.where(mask, torch.nan_to_num(u.grad), torch.zeros_like(u.grad))
+                u_last[name] = u.detach().clone()
+
+        optimizer.step()
+        with torch.no_grad():
+            for u in params:
+                u.clamp_(0.0, 1.0)
+
+        if key is not None and (i + 1) % checkpoint_every == 0:
+            save(i + 1)
+
+        if progress:
+            try:
+                progress(
+                    [
+                        str(i),
+                        str(num_iterations),
+                    ]
+                )
+            except Exception: # e.g. a cancelled job, keep its progress for a resume
+                if key is not None:
+                    save(i + 1)
+                raise
+
+    # a finished run has nothing left to resume
+    if key is not None:
+        clear_checkpoint(key)
+
+    # final objective of the optimized designs, a step of the last iteration may
+    # still have left the stable march
+    values = {name: x.detach().cpu().numpy() for name, x in designs().items()}
+    q, dP, T_out, _ = naive_model_grad(**{**default, **values})
+    final = np.asarray(objective_value(optimize_type, q, dP, T_out, default['T_in']), dtype=np.float64)
+    final = np.where(np.isfinite(final) & feasible_march(T_out, default['T_in'], default['T_w']), final, np.inf)
+    if not np.isfinite(final).any():
+        return [], loss, "No start ended on a feasible design (T_out in [T_in, T_w])."
+
+    u_final = np.stack([u.detach().cpu().numpy() for u in params], axis=-1)
+    ranked, kept = [], []
+    for j in np.argsort(final, kind='stable'):
+        if not np.isfinite(final[j]):
+            break
+        if any(np.max(np.abs(u_final[j] - u_final[k]), initial=0.0) <= 1e-3 for k in kept):
+            continue # the same design as a better ranked start
+        kept.append(j)
+        ranked.append({**{name: float(values[name][j]) for name in opt_names}, 'objective': final[j]})
+
+    return ranked, loss, None
+
+
+def optimize_model(parameter_choice, optimize_type='default', method='adam', progress=None, learning_rate=5e-2, max_iterations=1000, gtol=1e-6, ftol=1e-9, patience=20, gradient='analytic',
+                   checkpoint=None, resume=None, checkpoint_every=100, **default):
+    """
+    Bound-constrained optimization of the naive model with early stopping.
+
+    The chosen variables are optimized in coordinates normalized to their limits
+    (0 at 'min', 1 at 'max'), so the bounds are a unit box that both methods
+    enforce natively and one learning rate suits variables of any scale.
+
+    Parameters:
+        Geometry, fluid and operating parameters, as for sgd_model
+        parameter_choice (array): variables to optimize, a subset of 'L', 'W', 'H'
+        optimize_type (string): Pick a parameter to optimize: 'default', 'q', 'dP', 'T_out'
+        method (string): 'adam' (torch Adam, projected onto the bounds after every step)
+            or 'lbfgsb' (scipy L-BFGS-B)
+        progress (function): called with [iteration, max_iterations] after every iteration
+        learning_rate (float): Adam step size, in normalized coordinates
+        max_iterations (int): iteration limit
+        gtol (float): stop when the projected gradient norm is below gtol * max(1, |objective|)
+        ftol (float): stop when the objective changes by less than ftol * max(1, |objective|);
+            for Adam, when the best objective improves by less than that in patience iterations
+        patience (int): Adam iterations over which the improvement is measured for ftol
+        gradient (string): 'analytic' (naive_model_grad) or 'autograd' (naive_model_torch)
+        checkpoint (string): key (e.g. a job id) to save the optimizer state under,
+            see model.checkpoint; defaults to resume
+        resume (string): key of a checkpoint to continue from. L-BFGS-B restarts from
+            the checkpointed iterate, without its curvature memory
+        checkpoint_every (int): iterations between checkpoints
+
+    Returns:
+        dict with
+            x (dict): optimized L, W, H [m]
+            objective (float): final objective value
+            iterations (int): number of iterations run
+            converged (bool): whether a tolerance was met
+            reason (string): why the optimizer stopped
+            loss (array): objective per iteration
+    """
+    opt_names = ["L", "W", "H"]
+    parameter_choice = [var for var in opt_names if var in parameter_choice]
+    bounds = np.array([get_bounds(var) for var in parameter_choice], dtype=np.float64).reshape(-1, 2)
+    lo, span = bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+    u0 = np.clip((np.array([default[var] for var in parameter_choice], dtype=np.float64) - lo) / span, 0.0, 1.0)
+
+    def evaluate(u):
+        # objective and its gradient with respect to the normalized variables
+        x = lo + u * span
+        if gradient == 'analytic':
+            q, dP, T_out, jac = naive_model_grad(**{**default, **dict(zip(parameter_choice, x))})
+            f = objective_value(optimize_type, q, dP, T_out, default['T_in'])
+            g = objective_grad(optimize_type, q, dP, T_out, default['T_in'], jac)
+            g = np.array([g[var] for var in parameter_choice], dtype=np.float64)
+        elif gradient == 'autograd':
+            import torch
+            from model.naive_torch import naive_model_torch
+
+            xt = torch.tensor(x, dtype=torch.float64, requires_grad=True)
+            q, dP, T_out = naive_model_torch(**{**default, **{var: xt[d] for d, var in enumerate(parameter_choice)}})
+            f = objective_value(optimize_type, q, dP, T_out, default['T_in'])
+            g = torch.autograd.grad(f, xt)[0].numpy() if xt.numel() else np.zeros(0)
+            f = f.item()
+        else:
+            raise ValueError("Invalid gradient, must be 'autograd' or 'analytic'")
+        return float(f), g * span
+
+    def projected_norm(u, g):
+        # gradient norm, ignoring components that push against an active bound
+        g = np.where(((u <= 0.0) & (g > 0)) | ((u >= 1.0) & (g < 0)), 0.0, g)
+        return np.linalg.norm(g)
+
+    loss = []
+    converged = False
+
+    key = checkpoint if checkpoint is not None else resume
+    state = load_checkpoint(resume) if resume is not None else None
+    if state is not None:
+        if state['method'] != method or state['parameter_choice'] != parameter_choice:
+            raise ValueError(f"Checkpoint {resume} does not match method / parameter_choice")
+        u0 = state['u']
+        loss = list(state['loss'])
+        set_rng_state(state['rng'])
+
+    def save(u, optimizer_state=None):
+        save_checkpoint(key, {
+            'method': method,
+            'parameter_choice': parameter_choice,
+            'u': np.array(u, dtype=np.float64),
+            'optimizer': optimizer_state,
+            'loss': list(loss),
+            'rng': rng_state(),
+        })
+
+    if method == 'adam':
+        import torch
+
+        u = torch.tensor(u0, dtype=torch.float64, requires_grad=True)
+        # the objective falls by orders of magnitude on the way, so the second moment only
+        # remembers a few iterations (the gradients are exact, not noisy), else the steps
+        # stay as small as the first, large gradients make them
+        optimizer = torch.optim.Adam([u], lr=learning_rate, betas=(0.9, 0.9))
+        if state is not None:
+            optimizer.load_state_dict(state['optimizer'])
+        reason = 'Reached max_iterations.'
+
+        for i in range(len(loss), max_iterations):
+            f, g = evaluate(u.detach().numpy())
+            loss.append(f)
+            if not math.isfinite(f):
+                reason = 'Objective / Loss has diverged.'
+                break
+
+            scale = max(1.0, abs(f))
+            if projected_norm(u.detach().numpy(), g) <= gtol * scale:
+                converged, reason = True, 'Projected gradient norm below gtol.'
+                break
+            # Adam does not settle monotonically, so the ftol test compares the best objective
+            # of the last patience iterations with the best one before them
+            if len(loss) > patience and min(loss[:-patience]) - min(loss[-patience:]) <= ftol * scale:
+                converged, reason = True, 'Objective change below ftol.'
+                break
+
+            optimizer.zero_grad(set_to_none=True)
+            u.grad = torch.from_numpy(g)
+            optimizer.step()
+            with torch.no_grad():
+                u.clamp_(0.0, 1.0)
+
+            if key is not None and (i + 1) % checkpoint_every == 0:
+                save(u.detach().numpy(), optimizer.state_dict())
+
+            if progress:
+                try:
+                    progress([str(i), str(max_iterations)])
+                except Exception: # e.g. a cancelled job, keep its progress for a resume
+                    if key is not None:
+                        save(u.detach().numpy(), optimizer.state_dict())
+                    raise
+
+        u_opt = u.detach().numpy()
+        iterations = len(loss)
+
+    elif method == 'lbfgsb':
+        f0, _ = evaluate(u0)
+        scale = max(1.0, abs(f0))
+        last = {'f': f0}
+        done = len(loss)
+
+        def fun(u):
+            last['f'], g = evaluate(u)
+            return last['f'], g
+
+        def callback(u):
+            # the last evaluation is the accepted iterate
+            loss.append(last['f'])
+            if key is not None and len(loss) % checkpoint_every == 0:
+                save(u)
+            if progress:
+                try:
+                    progress([str(len(loss) - 1), str(max_iterations)])
+                except Exception: # e.g. a cancelled job, keep its progress for a resume
+                    if key is not None:
+                        save(u)
+                    raise
+
+        result = minimize(fun, u0, jac=True, method='L-BFGS-B', bounds=[(0.0, 1.0)] * len(u0), callback=callback,
+                          options={'maxiter': max(max_iterations - done, 0), 'gtol': gtol * scale, 'ftol': ftol})
+        u_opt = result.x
+        iterations = done + int(result.nit)
+        converged = bool(result.success)
+        reason = str(result.message)
+
+    else:
+        raise ValueError("Invalid method, must be 'adam' or 'lbfgsb'")
+
+    # a finished run has nothing left to resume
+    if key is not None:
+        clear_checkpoint(key)
+
+    x = {var: float(default[var]) for var in opt_names}
+    x.update(zip(parameter_choice, (lo + u_opt * span).tolist()))
+    objective, _ = evaluate(u_opt)
+
+    return {
+        'x': x,
+        'objective': objective,
+        'iterations': iterations,
+        'converged': converged,
+        'reason': reason,
+        'loss': np.array(loss),
+    }
 
 
 class SGD_MicroChannelCooler(MicroChannelCooler):
 
-    def solve_sgd(self, parameter_choice, optimize_type='default', progress=None, learning_rate = 1e-5, num_iterations = 100):
+    def solve_sgd(self, parameter_choice, optimize_type='default', progress=None, learning_rate = 1e-5, num_iterations = 100, gradient='autograd', **kwargs):
         '''
         Returns the optimized length, width, and depth using the gradient descent method w/ PyTorc
 
         Parameters:
             parameter_choice (array): Given user parameters to optimize for. If parameters are picked, they will not be kept constant, allowing those parameters to be optimized.
             optimize_type (string): Pick a parameter to optimize: 'default', 'q', 'dP', 'T_out'
+            gradient (string): 'autograd' or 'analytic', see sgd_model
+            kwargs: checkpoint options, see sgd_model
 
         Returns:
             L (float): optimized length [m]
@@ -134,12 +634,48 @@ class SGD_MicroChannelCooler(MicroChannelCooler):
         '''
         params = {'T_in': self.T_in, 'T_w': self.T_w, 'Q': self.Q,
                   **self.geometry.__dict__, **self.fluid.__dict__,}
-        args,loss,err = sgd_model(parameter_choice, optimize_type, progress, learning_rate, num_iterations, **params)
+        args,loss,err = sgd_model(parameter_choice, optimize_type, progress, learning_rate, num_iterations, gradient, **kwargs, **params)
         
         print(err)
         print(max(loss))
 
         return args
+
+    def solve_opt(self, parameter_choice, optimize_type='default', method='adam', progress=None, **kwargs):
+        '''
+        Returns the bound-constrained optimum found by optimize_model
+
+        Parameters:
+            parameter_choice (array): Given user parameters to optimize for.
+            optimize_type (string): Pick a parameter to optimize: 'default', 'q', 'dP', 'T_out'
+            method (string): 'adam' or 'lbfgsb'
+            kwargs: tolerances, limits and checkpoint options, see optimize_model
+
+        Returns:
+            result (dict): optimized 'x', 'objective', 'iterations', 'converged', 'reason' and 'loss'
+        '''
+        params = {'T_in': self.T_in, 'T_w': self.T_w, 'Q': self.Q,
+                  **self.geometry.__dict__, **self.fluid.__dict__,}
+        return optimize_model(parameter_choice, optimize_type, method, progress, **kwargs, **params)
+
+    def solve_multistart(self, parameter_choice, optimize_type='default', progress=None, learning_rate = 1e-5, num_iterations = 100, n_starts=16, gradient='autograd', seed=None, **kwargs):
+        '''
+        Returns a ranked list of optimized designs from n_starts batched starting points
+
+        Parameters:
+            see sgd_multistart, kwargs are the checkpoint options
+
+        Returns:
+            ranked (list): dicts with the optimized L, W, H [m] and 'objective', best first
+        '''
+        params = {'T_in': self.T_in, 'T_w': self.T_w, 'Q': self.Q,
+                  **self.geometry.__dict__, **self.fluid.__dict__,}
+        ranked,loss,err = sgd_multistart(parameter_choice, optimize_type, progress, learning_rate, num_iterations, n_starts, gradient, seed, **kwargs, **params)
+
+        if err is not None:
+            print(err)
+
+        return ranked
     
 
 if __name__ == '__main__':